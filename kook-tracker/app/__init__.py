@@ -7,6 +7,7 @@ from config import Config
 from flask import Flask
 from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
+from response_cache import ResponseCache
 
 config = Config()
 app = Flask(__name__)
@@ -17,8 +18,12 @@ logging.basicConfig(level=logging.DEBUG)
 db = SQLAlchemy(app)
 migrate = Migrate(app, db, compare_type=True)
 client = Client(app)
+response_cache = ResponseCache(
+    max_entries=Config.RESPONSE_CACHE_MAX_ENTRIES,
+    max_bytes=Config.RESPONSE_CACHE_MAX_BYTES,
+)
 
-from app import models, parsers, routes  # noqa
+from app import exports, jobs, models, parsers, routes, updater  # noqa
 
 # make this season if it doesn't already exist
 # now = datetime.now()
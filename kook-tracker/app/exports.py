@@ -0,0 +1,257 @@
+"""
+Bulk exports of every heat result in a season, or in every season
+we have, with one row per result and its event, round, heat and
+athlete alongside, for loading into notebooks. All of the rows come
+from a single query, read a batch at a time, and get written out as
+they're read as either JSON Lines, or (if `pyarrow` is installed,
+e.g. with the `export` extra) as an Arrow IPC stream or Parquet file.
+From the `kook-tracker` directory, run e.g.
+
+    flask export --year 2025 --format parquet -o 2025.parquet
+
+or request `/export?year=2025&format=parquet`, leaving out the year
+to export every season.
+"""
+
+import io
+import json
+import sys
+import typing
+
+import click
+from sqlalchemy import select
+
+from app import app, db
+from app.models import wsl
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# the columns of an export, along with their Arrow types
+COLUMNS = [
+    ("year", "int16"),
+    ("event_id", "int64"),
+    ("event_name", "string"),
+    ("round_id", "int64"),
+    ("round_number", "int16"),
+    ("heat_id", "int64"),
+    # position of the heat in its round
+    ("heat_index", "int16"),
+    ("heat_status", "int8"),
+    ("heat_completed", "bool"),
+    # position of the athlete in the heat
+    ("result_index", "int16"),
+    ("athlete_id", "int64"),
+    ("athlete_name", "string"),
+    ("score", "float64"),
+]
+
+FORMATS = {
+    "jsonl": ("application/x-ndjson", "jsonl"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def iter_batches(
+    year: typing.Optional[int] = None, batch_size: int = 5000
+) -> typing.Iterator[typing.List[tuple]]:
+    """
+    Generate the heat results of the season `year`, or of every
+    season if it's `None`, as lists of at most `batch_size` rows
+    with the values of `COLUMNS`
+    """
+    stmt = (
+        select(
+            wsl.Event.year,
+            wsl.Event.id,
+            wsl.Event.name,
+            wsl.Round.id,
+            wsl.Round.number,
+            wsl.Heat.id,
+            wsl.Heat.status,
+            wsl.Heat.completed,
+            wsl.HeatResult.index,
+            wsl.Athlete.id,
+            wsl.Athlete.name,
+            wsl.HeatResult.score,
+        )
+        .join(wsl.Round, wsl.Round.event_id == wsl.Event.id)
+        .join(wsl.Heat, wsl.Heat.round_id == wsl.Round.id)
+        .outerjoin(wsl.HeatResult, wsl.HeatResult.heat_id == wsl.Heat.id)
+        .outerjoin(wsl.Athlete, wsl.HeatResult.athlete_id == wsl.Athlete.id)
+        .order_by(
+            wsl.Event.year,
+            wsl.Event.id,
+            wsl.Round.number,
+            wsl.Heat.id,
+            wsl.HeatResult.index,
+        )
+        .execution_options(yield_per=batch_size)
+    )
+    if year is not None:
+        stmt = stmt.where(wsl.Event.year == year)
+
+    # heats come back in ID order within their round, so count them
+    # off to get each one's position in it, including those without
+    # any results yet, same as `Event.iter_results`
+    round_id, heat_id, heat_index = None, None, -1
+    for partition in db.session.execute(stmt).partitions():
+        batch = []
+        for row in partition:
+            (
+                year_,
+                event_id,
+                event_name,
+                row_round_id,
+                round_number,
+                row_heat_id,
+                status,
+                completed,
+                index,
+                athlete_id,
+                athlete_name,
+                score,
+            ) = row
+            if row_round_id != round_id:
+                round_id, heat_index = row_round_id, -1
+            if row_heat_id != heat_id:
+                heat_id = row_heat_id
+                heat_index += 1
+            if athlete_id is None:
+                continue
+
+            batch.append(
+                (
+                    year_,
+                    event_id,
+                    event_name,
+                    round_id,
+                    round_number,
+                    heat_id,
+                    heat_index,
+                    status,
+                    bool(completed),
+                    index,
+                    athlete_id,
+                    athlete_name,
+                    float(score) if score is not None else None,
+                )
+            )
+        yield batch
+
+
+def iter_jsonl(year: typing.Optional[int] = None) -> typing.Iterator[str]:
+    """Generate an export as JSON Lines, a batch of rows at a time"""
+    names = [name for name, _ in COLUMNS]
+    for batch in iter_batches(year):
+        yield "".join(
+            json.dumps(dict(zip(names, row))) + "\n" for row in batch
+        )
+
+
+def _check_pyarrow(format):
+    if pa is None:
+        raise RuntimeError(
+            f"Exporting to {format} requires pyarrow, "
+            "which can be installed with the 'export' extra"
+        )
+
+
+def _get_schema():
+    return pa.schema([(name, type_) for name, type_ in COLUMNS])
+
+
+def _to_record_batch(batch, schema):
+    columns = list(zip(*batch)) or [[] for _ in COLUMNS]
+    return pa.RecordBatch.from_arrays(
+        [pa.array(c, type=f.type) for c, f in zip(columns, schema)],
+        schema=schema,
+    )
+
+
+def iter_arrow(year: typing.Optional[int] = None) -> typing.Iterator[bytes]:
+    """
+    Generate an export as an Arrow IPC stream, one
+    record batch per batch of rows read
+    """
+    _check_pyarrow("arrow")
+    schema = _get_schema()
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for batch in iter_batches(year):
+            writer.write_batch(_to_record_batch(batch, schema))
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    yield sink.getvalue()
+
+
+def write_parquet(year: typing.Optional[int], where: typing.BinaryIO):
+    """
+    Write an export to the file object `where` as Parquet, one row
+    group per batch of rows read. Parquet files only get their
+    footer once they're finished, so unlike the other formats
+    these can't be streamed.
+    """
+    _check_pyarrow("parquet")
+    schema = _get_schema()
+    with pq.ParquetWriter(where, schema) as writer:
+        for batch in iter_batches(year):
+            writer.write_batch(_to_record_batch(batch, schema))
+
+
+def iter_export(
+    year: typing.Optional[int], format: str
+) -> typing.Iterator[typing.Union[str, bytes]]:
+    """Generate an export in `format`, one of `FORMATS`"""
+    if format == "jsonl":
+        return iter_jsonl(year)
+
+    # check before any of it gets generated rather than partway
+    # through streaming it out
+    _check_pyarrow(format)
+    if format == "arrow":
+        return iter_arrow(year)
+    elif format == "parquet":
+        buffer = io.BytesIO()
+        write_parquet(year, buffer)
+        return iter([buffer.getvalue()])
+    raise ValueError(f"Unknown export format {format}")
+
+
+@app.cli.command("export")
+@click.option("--year", type=int, default=None, help="Defaults to all")
+@click.option(
+    "--format",
+    type=click.Choice(list(FORMATS)),
+    default="jsonl",
+    show_default=True,
+)
+@click.option(
+    "-o",
+    "--output",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Defaults to stdout for jsonl",
+)
+def export(year, format, output):
+    """Export every heat result in a season, or all of them"""
+    if output is None:
+        if format != "jsonl":
+            raise click.UsageError(f"Pass an --output to write {format} to")
+        for chunk in iter_jsonl(year):
+            sys.stdout.write(chunk)
+        return
+
+    if format == "parquet":
+        write_parquet(year, output)
+        return
+
+    mode = "w" if format == "jsonl" else "wb"
+    with open(output, mode) as f:
+        for chunk in iter_export(year, format):
+            f.write(chunk)
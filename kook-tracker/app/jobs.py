@@ -0,0 +1,262 @@
+"""
+Builds new events, and rebuilds existing ones, in the background.
+Scraping every page of an event can take minutes, so rather than
+holding a web worker for all of that, requests for events that
+need building queue up a `Job` and respond right away with where
+to follow along with it (`/jobs/<id>`). The updater process (see
+`app.updater`) claims queued jobs and runs them on a small pool of
+threads, so that they outlive web workers getting restarted, and
+they report their progress to the database as they go so that any
+worker can answer for them.
+"""
+
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from app import Config, app, client, db, parsers
+from app.models import wsl
+from app.models.jobs import DONE, FAILED, QUEUED, RUNNING, Job, utcnow
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    # made on first use, so that only the updater starts any threads
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                Config.JOB_WORKERS, thread_name_prefix="job"
+            )
+        return _executor
+
+
+# IDs of the jobs running on `_executor`, mapped to their futures
+_running = {}
+
+
+def _update_job(job_id, **values):
+    """
+    Write `values` to the job with ID `job_id` on a connection of its
+    own, so that they show up right away without committing anything
+    the job's in the middle of. SQLite only lets one connection write
+    at a time, so jobs only report in between writes of their own.
+    """
+    values["updated_at"] = utcnow()
+    with db.engine.begin() as connection:
+        connection.execute(update(Job).where(Job.id == job_id).values(values))
+
+
+def _create_event(year, name, progress):
+    event = wsl.Event.query.filter_by(name=name, year=year).first()
+    if event is not None:
+        return
+
+    # creating the season creates every event in it that's ready,
+    # which might be enough to create this one
+    season = db.session.get(wsl.Season, year)
+    if season is None:
+        progress(0, None, f"Creating the {year} season")
+        season = wsl.Season.create(year=year, progress=progress)
+        db.session.commit()
+        event = wsl.Event.query.filter_by(name=name, year=year).first()
+        if event is not None:
+            return
+
+    # otherwise try to create it on its own, which at the very least
+    # gives a more informative error as to what's invalid about it
+    progress(0, None, f"Looking up event {name}")
+    id = parsers.get_event_ids(season.url, event_names=name)[name]
+    stat_id = parsers.get_event_stat_id(id, year, name)
+    event = wsl.Event.create(
+        name=name, id=id, stat_id=stat_id, year=year, progress=progress
+    )
+    season.events.append(event)
+    db.session.add(event)
+    db.session.commit()
+
+
+def _reset_event(year, name, progress):
+    event = wsl.Event.query.filter_by(year=year, name=name).first()
+    if event is None:
+        raise ValueError(f"No event {name} in the {year} season")
+    id = event.id
+    stat_id = event.stat_id
+    data_version = event.data_version
+
+    progress(0, None, f"Deleting event {name}")
+    objects_deleted = wsl.delete_events([id])
+    db.session.commit()
+    app.logger.info("Deleted {} objects".format(objects_deleted))
+
+    # build the new event the same way seasons build theirs,
+    # fetching all of its pages up front rather than one by one
+    progress(0, None, f"Fetching pages for event {name}")
+    event = wsl.Event(id=id, stat_id=stat_id, name=name, year=year)
+    with wsl._prefetch_event_pages([event]):
+        event = wsl.Event.create(
+            name=name, id=id, stat_id=stat_id, year=year, progress=progress
+        )
+
+    # keep counting up from the old event's version so that
+    # nothing cached for it gets mistaken for the new one
+    event.data_version = data_version + 1
+
+    db.session.add(event)
+    db.session.commit()
+
+
+KINDS = {"create": _create_event, "reset": _reset_event}
+
+
+def _run(job_id):
+    with app.app_context():
+        job = db.session.get(Job, job_id)
+        kind, year, name = job.kind, job.year, job.name
+        db.session.rollback()
+        app.logger.info(f"Starting job {job_id}: {kind} {name} {year}")
+        _update_job(job_id, message="Started")
+
+        def progress(done, total, message):
+            app.logger.debug(f"Job {job_id}: {message}")
+            _update_job(job_id, done=done, total=total, message=message)
+
+        try:
+            with client.plan():
+                KINDS[kind](year, name, progress)
+        except Exception as e:
+            app.logger.exception(f"Job {job_id} failed")
+            db.session.rollback()
+            _update_job(
+                job_id,
+                status=FAILED,
+                error=f"{type(e).__name__}: {e}",
+                finished_at=utcnow(),
+            )
+        else:
+            app.logger.info(f"Finished job {job_id}")
+            _update_job(
+                job_id,
+                status=DONE,
+                done=func.coalesce(Job.total, Job.done),
+                message="Finished",
+                finished_at=utcnow(),
+            )
+        finally:
+            db.session.remove()
+
+
+def submit(kind: str, year: int, name: str) -> Job:
+    """
+    Queue up a job of `kind`, one of `KINDS`, for the event `name`
+    in the `year` season, for the updater to run. If a job of any
+    kind is already queued or running for the same event, that gets
+    returned instead, so that two jobs never build the same event
+    at once. The database holds to that even when two workers try
+    queueing jobs for the same event at the same time.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Unknown job kind {kind}")
+
+    while True:
+        job = Job(kind=kind, year=year, name=name, status=QUEUED)
+        try:
+            with db.session.begin_nested():
+                db.session.add(job)
+        except IntegrityError:
+            job = Job.query.filter(
+                Job.year == year,
+                Job.name == name,
+                Job.status.in_([QUEUED, RUNNING]),
+            ).first()
+            if job is None:
+                # it finished in the meantime, so queue up a new one
+                continue
+        db.session.commit()
+        return job
+
+
+def _fail_abandoned(running):
+    # jobs left running by an updater that's gone away stop
+    # getting their heartbeats, see `run_queued`. The ones
+    # `running` in this process obviously haven't been abandoned
+    timeout = datetime.timedelta(seconds=Config.JOB_TIMEOUT_SECONDS)
+    result = db.session.execute(
+        update(Job)
+        .where(
+            Job.status == RUNNING,
+            Job.updated_at < utcnow() - timeout,
+            Job.id.not_in(running),
+        )
+        .values(
+            status=FAILED,
+            error="Abandoned by its updater",
+            finished_at=utcnow(),
+        )
+    )
+    db.session.commit()
+    if result.rowcount:
+        app.logger.warning(f"Failed {result.rowcount} abandoned jobs")
+
+
+def _claim(job_id):
+    # only one updater can move a job on from queued
+    result = db.session.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.status == QUEUED)
+        .values(status=RUNNING, updated_at=utcnow())
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def run_queued():
+    """
+    Keep the jobs running in this process alive, then claim as
+    many queued jobs as there are threads free to run them on,
+    oldest first, and start them. Meant to be called regularly,
+    and more often than every `JOB_TIMEOUT_SECONDS`, by the
+    updater. Returns the number of jobs started.
+    """
+    for job_id, future in list(_running.items()):
+        if future.done():
+            del _running[job_id]
+
+    running = list(_running)
+    if running:
+        try:
+            db.session.execute(
+                update(Job)
+                .where(Job.id.in_(running), Job.status == RUNNING)
+                .values(updated_at=utcnow())
+            )
+            db.session.commit()
+        except OperationalError:
+            # e.g. SQLite being busy with one of the jobs' own
+            # writes, which bump them anyway. Either way these
+            # won't get taken for abandoned by this updater
+            db.session.rollback()
+            app.logger.debug("Skipped job heartbeats", exc_info=True)
+
+    _fail_abandoned(running)
+    num_free = Config.JOB_WORKERS - len(_running)
+    if num_free <= 0:
+        return 0
+
+    num_started = 0
+    queued = db.session.scalars(
+        select(Job.id)
+        .where(Job.status == QUEUED)
+        .order_by(Job.id)
+        .limit(num_free)
+    ).all()
+    for job_id in queued:
+        if _claim(job_id):
+            _running[job_id] = _get_executor().submit(_run, job_id)
+            num_started += 1
+    return num_started
@@ -1,8 +1,34 @@
+import datetime
+import typing
 from collections import defaultdict
 from dataclasses import dataclass
 
+from colorutils import Color
+
 from app import app
-from app.rosters import rosters, year_long_picks
+from app.models.wsl import normalize_athlete_name
+from app.rosters import RosterStore
+
+
+def _initials(name: str) -> str:
+    """Short team tag for a kook, e.g. 'Alec G' -> 'AG'."""
+    return "".join(part[0] for part in name.split() if part).upper()
+
+
+def _get_text_color(background_color: str) -> str:
+    """
+    Utility function for deciding whether to
+    use black or white text depending on the
+    background color of the given cell
+    """
+    # get the "value" of the color: i.e. a
+    # number representing how light or dark
+    # the color is
+    _, __, v = Color(hex=background_color).hsv
+
+    # if the value is sufficiently dark, use
+    # white text, otherwise use black
+    return "#ffffff" if v < 0.3 else "#000000"
 
 
 @dataclass
@@ -14,6 +40,10 @@ class Kook:
         self.rosters = defaultdict(dict)
         self.year_longs = defaultdict(dict)
 
+        # what pages display this kook with
+        self.initials = _initials(self.name)
+        self.text_color = _get_text_color(self.color)
+
     def add_roster(self, season, event, athletes):
         self.rosters[season][event] = athletes
 
@@ -21,6 +51,47 @@ class Kook:
         self.year_longs[season][event] = athlete
 
 
+def initialize(name):
+    """Shorten an athlete's name to the form WSL uses, e.g. 'J. Smith'"""
+    names = name.split()
+    return names[0][0] + ". " + names[-1]
+
+
+class RosterIndex:
+    """
+    Every kook's roster for every event, indexed so that finding
+    which kook rostered an athlete, or all of an event's rosters,
+    is a single dict lookup. Athletes are indexed by their
+    normalized, initialized names, the way WSL and the athlete
+    index refer to them.
+    """
+
+    def __init__(self):
+        self._owners = {}
+        self._rosters = defaultdict(dict)
+
+    def add(self, kook, season, event, athletes):
+        athletes = list(map(initialize, athletes))
+        self._rosters[(str(season), event)][kook.name] = athletes
+        for name in athletes:
+            # if two kooks somehow roster the same athlete,
+            # the first one to have done it keeps them
+            key = (str(season), event, normalize_athlete_name(name))
+            self._owners.setdefault(key, kook)
+
+    def find_kook(self, season, event, athlete_name) -> typing.Optional[Kook]:
+        """The kook that rostered `athlete_name` for `event`, if any"""
+        key = (str(season), event, normalize_athlete_name(athlete_name))
+        return self._owners.get(key)
+
+    def get_rosters(self, season, event) -> typing.Dict[str, typing.List[str]]:
+        """
+        Each kook's roster for `event` as initialized athlete
+        names, keyed by the kook's name in the order of `kooks`
+        """
+        return self._rosters.get((str(season), event), {})
+
+
 ranch_scores = {
     2023: {
         "Nick S": 4745,
@@ -79,30 +150,59 @@ kook_names = [
     "RJ D",
 ]
 
-kooks = [Kook(name, color) for name, color in zip(kook_names, palette)]
-for year, events in rosters.items():
-    for event, rstrs in events.items():
-        for kook in kooks:
-            try:
-                roster = rstrs[kook.name]
-            except KeyError:
-                continue
-            kook.add_roster(year, event, roster)
-
-            try:
-                year_long = year_long_picks[year][event]
-            except KeyError:
-                app.logger.warn(
-                    "Missing year long picks for event {} {}".format(
-                        year, event
+
+class Kooks(typing.NamedTuple):
+    """
+    Everything built from one version of the rosters: the kooks
+    with their rosters and year long picks, and the index of them
+    """
+
+    kooks: typing.List[Kook]
+    index: RosterIndex
+    version: str
+    # in UTC, the last time any of the roster files was modified
+    modified_at: datetime.datetime
+
+
+def _build_kooks(rosters, year_long_picks, version, modified_at) -> Kooks:
+    kooks = [Kook(name, color) for name, color in zip(kook_names, palette)]
+    roster_index = RosterIndex()
+    for year, events in rosters.items():
+        for event, rstrs in events.items():
+            for kook in kooks:
+                try:
+                    roster = rstrs[kook.name]
+                except KeyError:
+                    continue
+                kook.add_roster(year, event, roster)
+                roster_index.add(kook, year, event, roster)
+
+                try:
+                    year_long = year_long_picks[year][event]
+                except KeyError:
+                    app.logger.warn(
+                        "Missing year long picks for event {} {}".format(
+                            year, event
+                        )
                     )
-                )
-                continue
-
-            try:
-                pick = year_long[kook.name]
-            except KeyError:
-                raise ValueError(
-                    f"Kook {kook.name} has no pick for event {event}"
-                )
-            kook.add_year_long(year, event, pick)
+                    continue
+
+                try:
+                    pick = year_long[kook.name]
+                except KeyError:
+                    raise ValueError(
+                        f"Kook {kook.name} has no pick for event {event}"
+                    )
+                kook.add_year_long(year, event, pick)
+    return Kooks(kooks, roster_index, version, modified_at)
+
+
+roster_store = RosterStore(_build_kooks)
+
+
+def get_kooks() -> Kooks:
+    """
+    The kooks built from the latest rosters. Grab them once
+    per request so that it sees the same rosters throughout.
+    """
+    return roster_store.get()
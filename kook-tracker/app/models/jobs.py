@@ -0,0 +1,70 @@
+"""
+Background jobs building events from WSL's pages, kept in the
+database so that whichever worker gets asked about one can report
+on it, not just the one running it. See `app.jobs`.
+"""
+
+import datetime
+
+from app import Config, db
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def utcnow():
+    # naive UTC, like `Event.updated_at`
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+# queued and running jobs, at most one of which can be for any one event
+_UNFINISHED = db.text(f"status IN ('{QUEUED}', '{RUNNING}')")
+
+
+class Job(db.Model):
+    __table_args__ = (
+        db.Index(
+            "ix_job_unfinished_year_name",
+            "year",
+            "name",
+            unique=True,
+            postgresql_where=_UNFINISHED,
+            sqlite_where=_UNFINISHED,
+        ),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    # one of `app.jobs.KINDS`
+    kind = db.Column(db.String(16), nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+    name = db.Column(db.String(128))
+
+    status = db.Column(db.String(16), nullable=False, default=QUEUED)
+    # steps finished out of how many there are, where the
+    # total is `None` until the job's worked out what it is
+    done = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer)
+    message = db.Column(db.String(256))
+    error = db.Column(db.Text)
+
+    created_at = db.Column(db.DateTime, default=utcnow)
+    # bumped with every bit of progress, and regularly by the
+    # updater while it's running the job, so that jobs whose
+    # updater went away without finishing them can be told apart
+    updated_at = db.Column(db.DateTime, default=utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED)
+
+    @property
+    def abandoned(self):
+        # queued jobs can wait behind others for as long as they
+        # need to, it's only jobs left running that get abandoned
+        if self.status != RUNNING:
+            return False
+        timeout = datetime.timedelta(seconds=Config.JOB_TIMEOUT_SECONDS)
+        return self.updated_at < utcnow() - timeout
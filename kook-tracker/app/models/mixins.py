@@ -1,9 +1,10 @@
 import logging
 
-from app import db
+from app import client, db
 
 
 class Updatable:
+    @client.plan()
     def update(self):
         if not self.completed:
             try:
@@ -0,0 +1,59 @@
+"""
+Standings computed from the raw WSL results and persisted, so that
+pages can read them rather than rescoring every event on every
+view. Rows get recomputed by `app.scoring` when the transaction
+that changed their heats commits, for just the athletes who were
+in those heats and the teams that have them rostered.
+"""
+
+from app import db
+
+
+class AthleteStanding(db.Model):
+    event_id = db.Column(
+        db.Integer, db.ForeignKey("event.id"), primary_key=True
+    )
+    athlete_id = db.Column(
+        db.Integer, db.ForeignKey("athlete.id"), primary_key=True
+    )
+
+    points = db.Column(db.Integer)
+    round_number = db.Column(db.Integer)
+    heat_index = db.Column(db.Integer)
+    heat_completed = db.Column(db.Boolean)
+    winner = db.Column(db.Boolean)
+
+
+class TeamStanding(db.Model):
+    event_id = db.Column(
+        db.Integer, db.ForeignKey("event.id"), primary_key=True
+    )
+    kook = db.Column(db.String(64), primary_key=True)
+
+    score = db.Column(db.Integer)
+    possible = db.Column(db.Integer)
+    medal = db.Column(db.String(16), default=None)
+
+    # digest of the roster these were scored
+    # with, to tell when it's been changed
+    roster = db.Column(db.String(32))
+
+
+_STALE = "stale_standings"
+
+
+def mark_stale(event_id, athlete_ids):
+    """
+    Flag the standings of `athlete_ids` in the event with ID
+    `event_id` for recomputing when the current transaction commits
+    """
+    stale = db.session.info.setdefault(_STALE, {})
+    stale.setdefault(event_id, set()).update(athlete_ids)
+
+
+def pop_stale(session):
+    """
+    Clear out and return the athlete IDs flagged
+    in `session`, keyed by the ID of their event
+    """
+    return session.info.pop(_STALE, {})
@@ -1,8 +1,15 @@
 import datetime
 import re
+import unicodedata
+from contextlib import contextmanager
 
-from app import Config, app, db, parsers
-from app.models import mixins
+from sqlalchemy import and_, delete
+from sqlalchemy import event as sa_event
+from sqlalchemy import insert, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import Config, app, client, db, parsers
+from app.models import mixins, standings
 
 
 class HeatResult(db.Model):
@@ -11,6 +18,7 @@ class HeatResult(db.Model):
         db.Integer,
         db.ForeignKey("athlete.id"),
         # primary_key=True
+        index=True,
     )
 
     index = db.Column(db.Integer, primary_key=True)
@@ -33,17 +41,395 @@ def _is_placeholder_athlete_name(athlete_name):
     return False
 
 
+# wavepool events, which we skip because of their different structure
+WAVEPOOL_EVENTS = ("freshwater-pro", "surf-abu-dhabi-pro")
+
+
+def _get_num_pre_bracket_rounds(year):
+    # 2026+: only round 0 (opening elimination) is a non-bracket
+    # grid round. Pre-2026: rounds 0 and 1 are non-bracket grid rounds.
+    return 1 if int(year) >= 2026 else 2
+
+
 class Athlete(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(128))
+    name = db.Column(db.String(128), index=True, unique=True)
     heats = db.relationship("HeatResult", back_populates="athlete")
 
 
+def normalize_athlete_name(name):
+    """
+    The key athlete names get matched on, ignoring differences in
+    unicode representation, case and spacing between sources of names
+    """
+    return unicodedata.normalize("NFC", " ".join(name.split())).casefold()
+
+
+class AthleteIndex:
+    """
+    In-process map from normalized athlete names to athlete IDs,
+    shared by scraping and rendering so that resolving a name
+    is a dict lookup rather than a query. Gets warmed with every
+    athlete in one query the first time it's used. Athletes added
+    since then (e.g. by another process) get looked up on a miss
+    and remembered. Athletes inserted in this process are only
+    remembered once the transaction inserting them commits, so a
+    rollback can't leave the map pointing at rows that don't exist.
+    """
+
+    _PENDING = "pending_athlete_ids"
+
+    def __init__(self):
+        self._ids = None
+
+    def warm(self):
+        ids = {}
+        rows = db.session.execute(
+            select(Athlete.id, Athlete.name).order_by(Athlete.id)
+        )
+        for id, name in rows:
+            ids.setdefault(normalize_athlete_name(name), id)
+        self._ids = ids
+
+    def _lookup(self, key):
+        try:
+            return db.session.info[self._PENDING][key]
+        except KeyError:
+            pass
+
+        if self._ids is None:
+            self.warm()
+        return self._ids.get(key)
+
+    def get(self, name):
+        """Return the ID of the athlete named `name`, or `None`"""
+        return self.get_many([name]).get(name)
+
+    def get_many(self, names):
+        """
+        Map each of `names` to the ID of its athlete, leaving
+        out any that aren't in the database, in one query at most
+        """
+        ids, missing = {}, []
+        for name in names:
+            id = self._lookup(normalize_athlete_name(name))
+            if id is None:
+                missing.append(name)
+            else:
+                ids[name] = id
+
+        if missing:
+            rows = db.session.execute(
+                select(Athlete.id, Athlete.name)
+                .where(Athlete.name.in_(missing))
+                .order_by(Athlete.id)
+            )
+            for id, name in rows:
+                if ids.setdefault(name, id) == id:
+                    self._ids.setdefault(normalize_athlete_name(name), id)
+        return ids
+
+    def add(self, name, id):
+        """Record a newly inserted athlete, pending commit"""
+        pending = db.session.info.setdefault(self._PENDING, {})
+        pending.setdefault(normalize_athlete_name(name), id)
+
+    def _commit(self, session):
+        pending = session.info.pop(self._PENDING, {})
+        if self._ids is not None:
+            for key, id in pending.items():
+                self._ids.setdefault(key, id)
+
+    def _rollback(self, session):
+        session.info.pop(self._PENDING, None)
+
+
+athlete_index = AthleteIndex()
+sa_event.listen(db.session, "after_commit", athlete_index._commit)
+sa_event.listen(db.session, "after_rollback", athlete_index._rollback)
+
+
+def _upsert(model, rows, index_elements, update_columns):
+    """
+    Insert `rows` into the table for `model`, updating
+    `update_columns` of any rows that already exist
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        module = postgresql if dialect == "postgresql" else sqlite
+        stmt = module.insert(model)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=index_elements,
+            set_={col: stmt.excluded[col] for col in update_columns},
+        )
+        db.session.execute(stmt, rows)
+        return
+
+    # everything else: delete whatever's already there and reinsert
+    table = model.__table__
+    db.session.execute(
+        delete(model).where(
+            or_(
+                *[
+                    and_(*[table.c[col] == row[col] for col in index_elements])
+                    for row in rows
+                ]
+            )
+        )
+    )
+    db.session.execute(insert(model), rows)
+
+
+def _insert_missing(model, rows, index_elements, returning):
+    """
+    Insert `rows` into the table for `model`, skipping any that
+    conflict with rows already there (e.g. ones another process
+    just inserted), and return `returning` for the rows inserted
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        module = postgresql if dialect == "postgresql" else sqlite
+        stmt = module.insert(model).on_conflict_do_nothing(
+            index_elements=index_elements
+        )
+    else:
+        # everything else: a plain insert, so a conflicting
+        # row fails the transaction rather than being skipped
+        stmt = insert(model)
+    return db.session.execute(stmt.returning(*returning), rows)
+
+
+def _same_score(existing, score):
+    # existing scores come back from the database as decimals
+    if existing is None or score is None:
+        return existing is None and score is None
+    return round(float(existing), 2) == round(float(score), 2)
+
+
+class HeatResultBatch:
+    """
+    Collects the scores for any number of heats and writes all of
+    their results at once: one query to load the heats' existing
+    results, one to look up their athletes, one to insert any
+    athletes we haven't seen before, and one upsert of the results
+    themselves, all inside the caller's transaction. Add heats with
+    `Heat.update_with_status_and_scores(status, scores, batch)`, then
+    call `write`. For heats whose status or results actually change,
+    the version of their event gets bumped and the standings of every
+    athlete who was or is now in them get recomputed when the
+    transaction commits.
+    """
+
+    def __init__(self):
+        self.updates = {}
+        self.changed = set()
+
+    def add(self, heat, status, scores):
+        # this gets called before the heat's status gets set, and
+        # heats that haven't been written yet don't have one at all
+        self.updates[heat.id] = (heat, status, scores)
+        if heat.status != status:
+            self.changed.add(heat.id)
+
+    def _resolve_names(self, existing):
+        """
+        Work out which athlete goes in each slot of each heat,
+        returning a list of `((heat_id, index), athlete_name, score)`
+        along with the slots whose results need to be deleted
+        """
+        results, deletes = [], []
+        for heat, status, scores in self.updates.values():
+            for index, (athlete_name, score) in enumerate(scores):
+                key = (heat.id, index)
+
+                # if we're being reported a placeholder athlete name,
+                # then make sure that the heat hasn't started yet. If it
+                # has, we need to investigate
+                if _is_placeholder_athlete_name(athlete_name) and status != 0:
+                    app.logger.warn(
+                        f"Still using placeholder name {athlete_name} "
+                        f"in ongoing heat {heat.id}"
+                    )
+
+                    try:
+                        _, existing_name, __ = existing[key]
+                    except KeyError:
+                        # case 1: there's no existing entry, so just move
+                        # on and pretend this never happend
+                        continue
+
+                    # case 2: that heat result has a placeholder
+                    # name attached to it: delete it and move on
+                    if _is_placeholder_athlete_name(existing_name):
+                        app.logger.warn(
+                            "Removing placeholder heat result "
+                            f"from heat {heat.id}"
+                        )
+                        deletes.append(key)
+                        continue
+                    # case 3: that heat used to have a real athete
+                    # associated with it. I guess keep it for now?
+                    else:
+                        athlete_name = existing_name
+
+                # when rounds update from some TBD placeholder to a real
+                # athlete, the result in that slot gets pointed at the
+                # new athlete. If this is not because the old athlete was
+                # a placeholder, we'll still do it but warn about it
+                try:
+                    _, existing_name, __ = existing[key]
+                except KeyError:
+                    pass
+                else:
+                    if existing_name != athlete_name and (
+                        not _is_placeholder_athlete_name(existing_name)
+                    ):
+                        app.logger.warn(
+                            "Athlete {} is being replaced by "
+                            "athlete {} in heat {}.".format(
+                                existing_name, athlete_name, heat.id
+                            )
+                        )
+                results.append((key, athlete_name, score))
+        return results, deletes
+
+    def _get_athlete_ids(self, names):
+        """
+        Map each of `names` to the ID of its athlete, creating
+        any athletes that don't exist yet. Note that this means
+        we will create some placeholder athletes, but they won't
+        have any heat results after things get updated
+        """
+        athlete_ids = athlete_index.get_many(names)
+
+        # only insert one athlete for names that normalize the same
+        new_names = {}
+        for name in names:
+            if name not in athlete_ids:
+                new_names.setdefault(normalize_athlete_name(name), name)
+        if new_names:
+            new_names = list(new_names.values())
+            app.logger.debug(f"Adding athletes {new_names} to database")
+            rows = _insert_missing(
+                Athlete,
+                [{"name": name} for name in new_names],
+                ["name"],
+                [Athlete.id, Athlete.name],
+            )
+            for id, name in rows:
+                athlete_index.add(name, id)
+
+            # anyone inserted by someone else in the meantime
+            # gets skipped above, and picked up here instead
+            athlete_ids.update(athlete_index.get_many(names))
+        return athlete_ids
+
+    def write(self):
+        if not self.updates:
+            return
+
+        # make sure the heats (and any new rounds and events
+        # they belong to) exist before pointing results at them
+        heats = [heat for heat, _, __ in self.updates.values()]
+        db.session.add_all(heats)
+        db.session.flush()
+
+        # results are indexed by the heat and the athlete's order in
+        # it, so that when rounds update from some TBD placeholder to
+        # a real athlete name we can update the athlete accordingly
+        rows = db.session.execute(
+            select(
+                HeatResult.heat_id,
+                HeatResult.index,
+                Athlete.id,
+                Athlete.name,
+                HeatResult.score,
+            )
+            .join(Athlete, HeatResult.athlete_id == Athlete.id)
+            .where(HeatResult.heat_id.in_(list(self.updates)))
+        )
+        existing = {
+            (h, i): (id, name, score) for h, i, id, name, score in rows
+        }
+
+        results, deletes = self._resolve_names(existing)
+        names = list(dict.fromkeys([name for _, name, __ in results]))
+        athlete_ids = self._get_athlete_ids(names)
+
+        if deletes:
+            db.session.execute(
+                delete(HeatResult).where(
+                    or_(
+                        *[
+                            and_(
+                                HeatResult.heat_id == h, HeatResult.index == i
+                            )
+                            for h, i in deletes
+                        ]
+                    )
+                )
+            )
+        if results:
+            rows = [
+                {
+                    "heat_id": heat_id,
+                    "index": index,
+                    "athlete_id": athlete_ids[name],
+                    "score": score,
+                }
+                for (heat_id, index), name, score in results
+            ]
+            _upsert(
+                HeatResult, rows, ["heat_id", "index"], ["athlete_id", "score"]
+            )
+
+        # work out which heats have new athletes or scores, and
+        # which athletes were or are now in each of them
+        changed = self.changed | {heat_id for heat_id, _ in deletes}
+        affected = {heat.id: set() for heat in heats}
+        for (heat_id, _), (athlete_id, __, ___) in existing.items():
+            affected[heat_id].add(athlete_id)
+        for key, name, score in results:
+            athlete_id = athlete_ids[name]
+            affected[key[0]].add(athlete_id)
+            try:
+                existing_id, _, existing_score = existing[key]
+            except KeyError:
+                changed.add(key[0])
+                continue
+            if existing_id != athlete_id or not _same_score(
+                existing_score, score
+            ):
+                changed.add(key[0])
+
+        events = {}
+        for heat in heats:
+            if heat.id in changed:
+                event = heat.round.event
+                events[event.id] = event
+                standings.mark_stale(event.id, affected[heat.id])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        for event in events.values():
+            event.data_version = Event.data_version + 1
+            event.updated_at = now.replace(tzinfo=None)
+
+        # the session doesn't know about any of the rows written
+        # above, so make sure it reloads anything that's changed
+        for obj in list(db.session.identity_map.values()):
+            if isinstance(obj, HeatResult) and obj.heat_id in self.updates:
+                db.session.expire(obj)
+            elif isinstance(obj, Athlete):
+                db.session.expire(obj, ["heats"])
+        for heat in heats:
+            db.session.expire(heat, ["athletes"])
+        self.updates, self.changed = {}, set()
+
+
 class Heat(mixins.Updatable, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     completed = db.Column(db.Boolean, default=False)
     status = db.Column(db.Integer, default=0)
-    round_id = db.Column(db.Integer, db.ForeignKey("round.id"))
+    round_id = db.Column(db.Integer, db.ForeignKey("round.id"), index=True)
     athletes = db.relationship("HeatResult", back_populates="heat")
 
     @classmethod
@@ -55,109 +441,60 @@ class Heat(mixins.Updatable, db.Model):
 
     def _do_update(self):
         try:
-            status, scores = parsers.get_heat_data(self.round.url, self.id)
+            heat_data = parsers.parse_round(self.round.url)
         except Exception as e:
             app.logger.error(e)
             return
+        self.update_from_round(heat_data)
+
+    def update_from_round(self, heat_data, batch=None):
+        """
+        Update this heat from `heat_data`, the index of all the
+        heats in its round returned by `parsers.parse_round`, writing
+        its results with `batch` if one is passed. Returns whether
+        the heat has completed.
+        """
+        if self.completed:
+            return True
+
+        try:
+            status, scores = heat_data[self.id]
+        except KeyError:
+            app.logger.error(
+                f"No data for heat {self.id} on page {self.round.url}"
+            )
+            return False
 
         app.logger.debug(
             f"Read scores {scores} for heat {self.id} with status {status}"
         )
-        self.update_with_status_and_scores(status, scores)
+        self.update_with_status_and_scores(status, scores, batch)
+        return self.completed
+
+    def update_with_status_and_scores(self, status, scores, batch=None):
+        """
+        Set this heat's status and update its results with `scores`,
+        a list of `(athlete_name, score)` for each athlete in the heat.
+        If a `HeatResultBatch` is passed, the results get queued on it
+        to be written along with the rest of the batch, otherwise
+        they get written right away.
+        """
+        write = batch is None
+        if write:
+            batch = HeatResultBatch()
+        batch.add(self, status, scores)
 
-    def update_with_status_and_scores(self, status, scores):
         self.status = status
-
-        for index, (athlete_name, score) in enumerate(scores):
-            # if we're being reported a placeholder athlete name,
-            # then make sure that the heat hasn't started yet. If it has,
-            # we need to investigate
-            if _is_placeholder_athlete_name(athlete_name) and status != 0:
-                app.logger.warn(
-                    f"Still using placeholder name {athlete_name} "
-                    f"in ongoing heat {self.id}"
-                )
-                heat_result = HeatResult.query.filter_by(
-                    heat=self, index=index
-                )
-
-                try:
-                    athlete = heat_result.first().athlete
-                except AttributeError:
-                    # case 1: there's no existing entry, so just move on and
-                    # pretend this never happend
-                    continue
-
-                # case 2: that heat result has a placeholder
-                # name attached to it: delete it and move on
-                if _is_placeholder_athlete_name(athlete.name):
-                    app.logger.warn(
-                        f"Removing placeholder heat result from heat {self.id}"
-                    )
-                    heat_result.delete()
-                    continue
-                # case 3: that heat used to have a real athete associated
-                # with it. I guess keep it for now?
-                else:
-                    athlete_name = athlete.name
-
-            # create athlete if they don't exist. Note that his means
-            # we will create some placeholder athletes, but
-            # they won't have any heat results after things get updated
-            athlete = Athlete.query.filter_by(name=athlete_name).first()
-            if athlete is None:
-                athlete = Athlete(name=athlete_name)
-                app.logger.debug(f"Adding athlete {athlete_name} to database")
-                db.session.add(athlete)
-                db.session.commit()
-
-            # index heat result by the heat and their order in the heat
-            # this way when rounds update from some TBD placeholder to
-            # a real athlete name we can update the athlete name accordingly
-            # the cost of this is having some placeholder athlete names in
-            # our athlete db but that seems like a small price to pay
-            heat_result = HeatResult.query.filter_by(
-                heat=self, index=index
-            ).first()
-
-            # first case: this heat result hasn't been created yet
-            # instantiate it and add it to our session
-            if heat_result is None:
-                heat_result = HeatResult(
-                    heat=self, index=index, athlete=athlete
-                )
-                self.athletes.append(heat_result)
-            else:
-                # second case: the heat has been created but the athlete
-                # being used to instantiate is being updated
-                if heat_result.athlete.name != athlete_name:
-                    # if this is not because the instantiated athlete was
-                    # a placeholder, we won't do this automatically, but
-                    # will leave it to you to do manually if you think this
-                    # is correct
-                    if not _is_placeholder_athlete_name(
-                        heat_result.athlete.name
-                    ):
-                        app.logger.warn(
-                            "Athlete {} is being replaced by "
-                            "athlete {} in heat {}.".format(
-                                heat_result.athlete.name, athlete_name, self.id
-                            )
-                        )
-
-                    # updat the heat result athlete
-                    heat_result.athlete = athlete
-
-            # update the heat result score
-            heat_result.score = score
         self.completed = status == 2
+        if write:
+            batch.write()
 
 
 class Round(mixins.Updatable, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     completed = db.Column(db.Boolean, default=False)
     number = db.Column(db.Integer)
-    event_id = db.Column(db.Integer, db.ForeignKey("event.id"))
+    event_id = db.Column(db.Integer, db.ForeignKey("event.id"), index=True)
     heats = db.relationship("Heat", backref="round", lazy="dynamic")
 
     @property
@@ -171,14 +508,28 @@ class Round(mixins.Updatable, db.Model):
     @classmethod
     def create(cls, **kwargs):
         obj = cls(**kwargs)
-        heat_ids = parsers.get_heat_ids(obj.url)
-        for id in heat_ids:
+        heat_data = parsers.parse_round(obj.url)
+
+        batch = HeatResultBatch()
+        for id, (status, scores) in heat_data.items():
             app.logger.debug(f"Creating heat {id}")
-            Heat.create(id=id, round=obj)
+            heat = Heat(id=id, completed=False, round=obj)
+            heat.update_with_status_and_scores(status, scores, batch)
+        batch.write()
+
         obj.completed = all([heat.completed for heat in obj.heats])
         return obj
 
     def _do_update(self):
+        # every heat in the round lives on the same page, so
+        # parse it once and hand each heat its own entry
+        try:
+            heat_data = parsers.parse_round(self.url)
+        except Exception as e:
+            app.logger.error(e)
+            return
+
+        batch = HeatResultBatch()
         no_more_updates = False
         heats = sorted(self.heats, key=lambda h: h.id)
         for heat in heats:
@@ -188,17 +539,18 @@ class Round(mixins.Updatable, db.Model):
                 athletes = [r.athlete.name for r in heat.athletes]
                 if any(list(map(_is_placeholder_athlete_name, athletes))):
                     app.logger.info(f"Updating athletes for heat {heat.id}")
-                    heat.update()
+                    heat.update_from_round(heat_data, batch)
                 continue
             else:
                 app.logger.info(f"Updating heat {heat.id}")
-                completed = heat.update()
+                completed = heat.update_from_round(heat_data, batch)
 
                 # if this heat is upcoming, then all proceeding
                 # heats in this round are by definition upcoming
                 # too, so we can stop trying to update heats
                 if heat.status == 0:
                     no_more_updates = True
+        batch.write()
 
         # if the last heat returned completd = True,
         # then we're done
@@ -206,6 +558,8 @@ class Round(mixins.Updatable, db.Model):
 
 
 class Event(mixins.Updatable, db.Model):
+    __table_args__ = (db.Index("ix_event_year_name", "year", "name"),)
+
     id = db.Column(db.Integer, primary_key=True)
     stat_id = db.Column(db.Integer)
     name = db.Column(db.String(128))
@@ -213,6 +567,14 @@ class Event(mixins.Updatable, db.Model):
     year = db.Column(db.Integer, db.ForeignKey("season.year"))
     rounds = db.relationship("Round", backref="event", lazy="dynamic")
 
+    # bumped every time any of the event's heats change, so
+    # that anything built from them can tell when it's stale
+    data_version = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0"
+    )
+    # in UTC, as of the last time the version got bumped
+    updated_at = db.Column(db.DateTime)
+
     @property
     def url(self):
         return parsers.get_event_url(self)
@@ -222,15 +584,57 @@ class Event(mixins.Updatable, db.Model):
         return sorted(self.rounds, key=lambda r: r.number)
 
     @classmethod
-    def create(cls, id: int, stat_id: int, name: str, year: int, **kwargs):
+    @client.plan()
+    def create(
+        cls,
+        id: int,
+        stat_id: int,
+        name: str,
+        year: int,
+        progress=None,
+        **kwargs,
+    ):
+        # `progress` gets called with the number of steps done, the
+        # total number of them and a message as the event gets built
+        progress = progress or _ignore_progress
         obj = cls(id=id, stat_id=stat_id, name=name, year=year)
 
         # first verify that status is ok and that we're close enough to the
         # event to warrant building it
-        status, start_date = parsers.get_event_data_from_event_homepage(obj)
+        obj._check_ready()
+
+        # double check that event is ready to be scraped by
+        # making sure that all the rounds have valid links
+        try:
+            round_ids = parsers.get_round_ids(obj)
+        except parsers.EventNotReady:
+            raise parsers.EventNotReady(
+                "No valid round links for event {}".format(obj.name)
+            )
+
+        # each pre-bracket round has its own page, and the bracket
+        # rounds all get parsed from the page of the first one, so
+        # grab all of these pages at once up front
+        pre_bracket = _get_num_pre_bracket_rounds(year)
+        round_urls = parsers.get_round_urls(obj, round_ids[: pre_bracket + 1])
+        progress(0, 2, f"Fetching {len(round_urls)} round pages")
+        with client.prefetch(round_urls):
+            progress(1, 2, f"Building {len(round_ids)} rounds")
+            obj._create_rounds(round_ids, pre_bracket)
+
+        # if this is an event from the past, we can set it completed up front
+        obj.completed = all([round_.completed for round_ in obj.rounds])
+        return obj
+
+    def _check_ready(self):
+        """
+        Raise an `EventNotReady` if this event has been cancelled or
+        postponed, or if we're not yet close enough to its start date
+        """
+        status, start_date = parsers.get_event_data_from_event_homepage(self)
         if status in ("canceled", "postponed"):
             raise parsers.EventNotReady(
-                "Status for event {} is currently {}".format(obj.name, status)
+                "Status for event {} is currently {}".format(self.name, status)
             )
         elif (
             datetime.datetime.now()
@@ -239,25 +643,13 @@ class Event(mixins.Updatable, db.Model):
             raise parsers.EventNotReady(
                 "Start date for event {} is {} days away, "
                 "stopping creation".format(
-                    obj.name, (start_date - datetime.datetime.now()).days
+                    self.name, (start_date - datetime.datetime.now()).days
                 )
             )
 
-        # double check that event is ready to be scraped by
-        # making sure that all the rounds have valid links
-        try:
-            round_ids = parsers.get_round_ids(obj)
-        except parsers.EventNotReady:
-            raise parsers.EventNotReady(
-                "No valid round links for event {}".format(obj.name)
-            )
-
-        # 2026+: only round 0 (opening elimination) is a non-bracket
-        # grid round. Pre-2026: rounds 0 and 1 are non-bracket grid rounds.
-        pre_bracket = 1 if int(year) >= 2026 else 2
-
+    def _create_rounds(self, round_ids, pre_bracket):
         # initialize all the internal rounds and heats
-        kwargs = {"event": obj, "completed": False}
+        kwargs = {"event": self, "completed": False}
         for n, round_id in enumerate(round_ids):
             app.logger.debug(f"Creating round {round_id}")
             if n < pre_bracket:
@@ -267,45 +659,84 @@ class Event(mixins.Updatable, db.Model):
                 round_ = Round(id=round_id, number=n, **kwargs)
                 break
 
+        # the bracket rounds all come from the same page,
+        # so write all of their results together
+        batch = HeatResultBatch()
         rounds = parsers.parse_bracket(round_.url)
         for i in range(1, len(rounds) + 1):
             heats = rounds[round_.id]
+            completed = []
             for id in sorted(heats.keys()):
                 heat = Heat(id=id, completed=False, round=round_)
                 status, scores = heats[id]
-                heat.update_with_status_and_scores(status, scores)
+                heat.update_with_status_and_scores(status, scores, batch)
+                completed.append(heat.completed)
 
-            round_.completed = all([i.completed for i in round_.heats])
+            round_.completed = all(completed)
 
             if i < len(rounds):
                 app.logger.debug(f"Creating round {round_id + i}")
                 round_ = Round(
                     id=round_id + i, number=pre_bracket + i, **kwargs
                 )
-
-        # if this is an event from the past, we can set it completed up front
-        obj.completed = all([round_.completed for round_ in obj.rounds])
-        return obj
+        batch.write()
 
     @property
     def results(self):
-        csv_string = "RoundNum,HeatNum,AthleteName,Score"
-        for i, round_ in enumerate(self.rounds):
-            for j, heat in enumerate(round_.heats):
-                for athlete in heat.athletes:
-                    score = athlete.score or 0.0
-                    csv_string += "\n{},{},{},{:0.2f}".format(
-                        i, j, athlete.athlete.name, score
-                    )
-        return csv_string
+        return "".join(self.iter_results())
+
+    def iter_results(self, batch_size=500):
+        """
+        Generate this event's results as CSV text, a batch of rows
+        at a time, streamed from a single query over its rounds,
+        heats and results. Rounds and heats get numbered by their
+        position in the event and round respectively, counting
+        those without any results.
+        """
+        yield "RoundNum,HeatNum,AthleteName,Score"
+        rows = db.session.execute(
+            select(Round.id, Heat.id, Athlete.name, HeatResult.score)
+            .outerjoin(Heat, Heat.round_id == Round.id)
+            .outerjoin(HeatResult, HeatResult.heat_id == Heat.id)
+            .outerjoin(Athlete, HeatResult.athlete_id == Athlete.id)
+            .where(Round.event_id == self.id)
+            .order_by(Round.number, Heat.id, HeatResult.index)
+            .execution_options(yield_per=batch_size)
+        )
+
+        i = j = -1
+        round_id = heat_id = None
+        for partition in rows.partitions():
+            lines = []
+            for row_round_id, row_heat_id, name, score in partition:
+                if row_round_id != round_id:
+                    round_id, heat_id = row_round_id, None
+                    i, j = i + 1, -1
+                if row_heat_id is None:
+                    continue
+                elif row_heat_id != heat_id:
+                    heat_id = row_heat_id
+                    j += 1
+                if name is None:
+                    continue
+
+                score = score or 0.0
+                lines.append("\n{},{},{},{:0.2f}".format(i, j, name, score))
+            yield "".join(lines)
 
     def _do_update(self):
         sorted_rounds = sorted(self.rounds, key=lambda round: round.id)
+        pre_bracket = _get_num_pre_bracket_rounds(self.year)
 
-        # 2026+: only round 0 is a non-bracket grid round.
-        # Pre-2026: rounds 0 and 1 are non-bracket grid rounds.
-        pre_bracket = 1 if int(self.year) >= 2026 else 2
+        # fetch the pages for every round that might need updating
+        # at once rather than one after another as we get to them
+        urls = [r.url for r in sorted_rounds[:pre_bracket] if not r.completed]
+        if not all([r.completed for r in sorted_rounds[pre_bracket:]]):
+            urls.append(sorted_rounds[pre_bracket].url)
+        with client.prefetch(urls):
+            self._update_rounds(sorted_rounds, pre_bracket)
 
+    def _update_rounds(self, sorted_rounds, pre_bracket):
         for round_ in sorted_rounds[:pre_bracket]:
             if not round_.update():
                 break
@@ -314,6 +745,7 @@ class Event(mixins.Updatable, db.Model):
             # start iterating through the bracket rounds
             rounds = parsers.parse_bracket(sorted_rounds[pre_bracket].url)
             all_rounds_complete = True
+            batch = HeatResultBatch()
 
             for round_ in sorted_rounds[pre_bracket:]:
                 if round_.completed:
@@ -325,7 +757,7 @@ class Event(mixins.Updatable, db.Model):
                         continue
 
                     status, scores = rounds[round_.id][heat.id]
-                    heat.update_with_status_and_scores(status, scores)
+                    heat.update_with_status_and_scores(status, scores, batch)
 
                     if not heat.status:
                         # if this heat is still upcoming, there's
@@ -350,6 +782,7 @@ class Event(mixins.Updatable, db.Model):
                 # if all the rounds have completed, mark
                 # the whole event as done
                 self.completed = all_rounds_complete
+            batch.write()
 
 
 class Season(db.Model):
@@ -361,18 +794,24 @@ class Season(db.Model):
         return parsers.get_season_url(self)
 
     @classmethod
-    def create(cls, year, **kwargs):
+    @client.plan()
+    def create(cls, year, progress=None, **kwargs):
         # allow for possibility that season starts in late
         # of the year before
         if year > (datetime.datetime.now().year + 1):
             raise ValueError(f"Cannot create season for future year {year}")
 
+        # `progress` gets told how many events have been looked
+        # at each time one gets committed, see `Event.create`
+        progress = progress or _ignore_progress
+
         # instantiate the season then add all the events we can to it
         obj = cls(year=year, **kwargs)
         db.session.add(obj)
+
+        event_ids = {}
         for name, id in parsers.get_event_ids(obj.url).items():
-            # skipping wavepool events because of their different structure
-            if name in ("freshwater-pro", "surf-abu-dhabi-pro"):
+            if name in WAVEPOOL_EVENTS:
                 continue
 
             # don't need to create events that have already been created
@@ -380,40 +819,117 @@ class Season(db.Model):
             event = Event.query.filter_by(name=name, id=id, season=obj).first()
             if event is not None:
                 continue
+            event_ids[name] = id
+
+        # creating an event walks a chain of pages (stat ID page, event
+        # homepage, then round pages), so rather than walking that chain
+        # one event at a time, fetch each link of it for every event at once
+        stat_urls = [
+            parsers.get_event_stat_url(id, year, name)
+            for name, id in event_ids.items()
+        ]
+        stat_ids = {}
+        with client.prefetch(stat_urls):
+            for name, id in event_ids.items():
+                try:
+                    stat_ids[name] = parsers.get_event_stat_id(id, year, name)
+                except ValueError:
+                    app.logger.info(
+                        f"Skipping creation of event {name} {year} "
+                        "because no stat ID was available"
+                    )
 
-            try:
-                stat_id = parsers.get_event_stat_id(id, year, name)
-            except ValueError:
-                app.logger.info(
-                    f"Skipping creation of event {name} {year} "
-                    "because no stat ID was available"
-                )
-                continue
+        events = [
+            Event(id=event_ids[name], stat_id=stat_id, name=name, year=year)
+            for name, stat_id in stat_ids.items()
+        ]
+        with _prefetch_event_pages(events):
+            for i, event in enumerate(events):
+                # ignore this event if it's not ready yet
+                try:
+                    event = Event.create(
+                        name=event.name,
+                        id=event.id,
+                        stat_id=event.stat_id,
+                        year=year,
+                    )
+                except parsers.EventNotReady:
+                    continue
+                else:
+                    obj.events.append(event)
+                    db.session.add(event)
+                    db.session.commit()
+                    progress(i + 1, len(events), f"Created event {event.name}")
+        return obj
 
-            # ignore this event if it's not ready yet
+
+def _ignore_progress(done, total, message):
+    pass
+
+
+@contextmanager
+def _prefetch_event_pages(events):
+    """
+    Concurrently fetch the homepage and round pages of
+    each of the given (unsaved) events which is ready to be
+    created, and keep them pinned for the duration of the context
+    """
+    homepage_urls = map(parsers.get_event_results_url, events)
+    with client.prefetch(homepage_urls):
+        round_urls = []
+        for event in events:
+            # this is just a best guess at what `Event.create` will
+            # need, so leave it to `create` to raise any errors
             try:
-                event = Event.create(
-                    name=name, id=id, stat_id=stat_id, year=year
-                )
-            except parsers.EventNotReady:
+                event._check_ready()
+                round_ids = parsers.get_round_ids(event)
+            except (parsers.EventNotReady, ValueError):
                 continue
-            else:
-                obj.events.append(event)
-                db.session.add(event)
-                db.session.commit()
-        return obj
+
+            pre_bracket = _get_num_pre_bracket_rounds(event.year)
+            round_ids = round_ids[: pre_bracket + 1]
+            round_urls.extend(parsers.get_round_urls(event, round_ids))
+
+        with client.prefetch(round_urls):
+            yield
+
+
+def delete_events(event_ids):
+    """
+    Delete the events with IDs `event_ids`, which can be a list or
+    a subquery selecting them, along with all of their standings,
+    rounds, heats and heat results. Each table gets cleared with a
+    single statement, selecting the rows to delete with subqueries
+    rather than loading them, and anything deleted gets removed
+    from the session. Returns the number of rows deleted.
+    """
+    rounds = select(Round.id).where(Round.event_id.in_(event_ids))
+    heats = select(Heat.id).where(Heat.round_id.in_(rounds))
+
+    # children first, since the subqueries selecting
+    # them depend on their parents still being there
+    statements = [
+        delete(HeatResult).where(HeatResult.heat_id.in_(heats)),
+        delete(Heat).where(Heat.id.in_(heats)),
+        delete(Round).where(Round.id.in_(rounds)),
+        delete(standings.AthleteStanding).where(
+            standings.AthleteStanding.event_id.in_(event_ids)
+        ),
+        delete(standings.TeamStanding).where(
+            standings.TeamStanding.event_id.in_(event_ids)
+        ),
+        delete(Event).where(Event.id.in_(event_ids)),
+    ]
+
+    num_deleted = 0
+    for stmt in statements:
+        stmt = stmt.execution_options(synchronize_session="fetch")
+        num_deleted += db.session.execute(stmt).rowcount
+    return num_deleted
 
 
 def delete_season(year):
-    season = Season.query.filter_by(year=year)
-    events = Event.query.filter_by(season=season.first())
-    for event in events:
-        rounds = Round.query.filter_by(event=event)
-        for round in rounds:
-            heats = Heat.query.filter_by(round=round)
-            for heat in heats:
-                HeatResult.query.filter_by(heat=heat).delete()
-            heats.delete()
-        rounds.delete()
-    events.delete()
-    season.delete()
+    num_deleted = delete_events(select(Event.id).where(Event.year == year))
+    stmt = delete(Season).where(Season.year == year)
+    stmt = stmt.execution_options(synchronize_session="fetch")
+    return num_deleted + db.session.execute(stmt).rowcount
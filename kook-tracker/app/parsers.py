@@ -5,8 +5,9 @@ from collections import defaultdict
 from itertools import product
 
 from config import Config
+from parser_backends import Strainer, strained
 
-from app import client
+from app import app, client
 
 _MONTHS = [
     "Jan",
@@ -24,6 +25,31 @@ _MONTHS = [
 ]
 
 
+# the classes of the divs holding each heat on a round page
+_HEAT_DIV_CLASSES = [
+    f"post-event-watch-{i}-{j}__heat"
+    for i, j in product(
+        ["heat", "wave-pool-hybrid"], ["grid", "bracket-stage"]
+    )
+]
+
+# the regions of each kind of WSL page that the parsers below
+# read. Parsers of the same page share one strainer, so that a
+# prefetched page only gets parsed once for all of them
+SEASON_PAGE = Strainer(("table", {"class": "tableType-event"}))
+EVENT_LINK_PAGE = Strainer(("h1", {"class": "event-information__title"}))
+EVENT_PAGE = Strainer(
+    ("div", {"class": "post-event-watch-round-nav__item"}),
+    ("span", {"class": "status-module__status"}),
+    ("span", {"class": "event-information__meta-item--date-range"}),
+    ("div", {"id": "live-strip"}),
+)
+ROUND_PAGE = Strainer(
+    ("div", {"class": _HEAT_DIV_CLASSES}),
+    ("div", {"class": "bracket-stage-round"}),
+)
+
+
 # =============================================================================
 #                         Utilities
 # =============================================================================
@@ -53,7 +79,13 @@ def get_event_data_from_season_homepage(season_url):
     url_split = season_url.split("/")
     year = int(url_split[url_split.index("events") + 1])
 
-    soup = client(season_url)
+    # copy so that callers are free to modify the cached data
+    event_data = client.extract(season_url, _parse_season_homepage, year)
+    return [dict(data) for data in event_data]
+
+
+@strained(SEASON_PAGE)
+def _parse_season_homepage(soup, year):
     event_table = soup.find("table", class_="tableType-event")
     even_rows = event_table.find_all("tr", class_="even")
     odd_rows = event_table.find_all("tr", class_="odd")
@@ -136,9 +168,7 @@ def get_event_ids(season_url, event_names=None):
                 event_id = int(event_id)
             except ValueError as exc:
                 if "invalid literal" in str(exc) and i == 0:
-                    soup = client(data["link"])
-                    header = soup.find("h1", class_="event-information__title")
-                    link = header.find("a").attrs["href"]
+                    link = client.extract(data["link"], _parse_event_link)
                     if not link.startswith("http"):
                         link = base + link
                     data["link"] = link
@@ -170,15 +200,41 @@ def get_event_ids(season_url, event_names=None):
     return event_ids
 
 
+@strained(EVENT_LINK_PAGE)
+def _parse_event_link(soup):
+    header = soup.find("h1", class_="event-information__title")
+    return header.find("a").attrs["href"]
+
+
 # =============================================================================
 #                    Event Page parsers
 # =============================================================================
-def get_event_stat_id(event_id, event_year, event_name):
-    url = Config.MAIN_URL + "/events/{}/ct/{}/{}/results".format(
+def get_event_stat_url(event_id, event_year, event_name):
+    return Config.MAIN_URL + "/events/{}/ct/{}/{}/results".format(
         event_year, event_id, event_name
     )
 
-    soup = client(url)
+
+def get_event_stat_id(event_id, event_year, event_name):
+    url = get_event_stat_url(event_id, event_year, event_name)
+    stat_id = client.extract(url, _parse_event_stat_id)
+    if stat_id is None:
+        raise ValueError(
+            "Couldn't find stat ID for event {} {}".format(
+                event_name, event_year
+            )
+        )
+
+    # when this page is already showing the men's event it's the same
+    # page as the one with the stat ID in its url that everything else
+    # reads, so don't go back out for that one too
+    if client.extract(url, _parse_shown_stat_id) == stat_id:
+        client.alias(url + f"?statEventId={stat_id}", url)
+    return stat_id
+
+
+@strained(EVENT_PAGE)
+def _parse_event_stat_id(soup):
     buttons = soup.find_all("div", class_="post-event-watch-round-nav__item")
     for button in buttons:
         span = button.find("span", class_="round-name")
@@ -189,15 +245,26 @@ def get_event_stat_id(event_id, event_year, event_name):
         match = re.search("(?<=statEventId=)[0-9]+", target)
         if match is None:
             continue
-        stat_id = int(match.group(0))
-        break
-    else:
-        raise ValueError(
-            "Couldn't find stat ID for event {} {}".format(
-                event_name, event_year
-            )
-        )
-    return stat_id
+        return int(match.group(0))
+    return None
+
+
+@strained(EVENT_PAGE)
+def _parse_shown_stat_id(soup):
+    """
+    The stat ID of the event whose results a page is showing, going
+    by the links to its rounds, or `None` if they don't all agree
+    """
+    stat_ids = set()
+    for div in soup.find_all("div", class_="post-event-watch-round-nav__item"):
+        link = div.find("a")
+        if link is None or "data-gtm-event" not in link.attrs:
+            continue
+        match = re.search("(?<=statEventId=)[0-9]+", link.get("href", ""))
+        stat_ids.add(match and int(match.group(0)))
+    if len(stat_ids) != 1:
+        return None
+    return stat_ids.pop()
 
 
 def get_event_url(event):
@@ -207,15 +274,23 @@ def get_event_url(event):
 
 
 def get_event_results_url(event):
-    return get_event_url(event) + f"/results?statEventId={event.stat_id}"
+    url = get_event_stat_url(event.id, event.year, event.name)
+    return url + f"?statEventId={event.stat_id}"
 
 
 def get_event_data_from_event_homepage(event):
     event_url = get_event_results_url(event)
-    url_split = event_url.split("/")
-    year = int(url_split[url_split.index("events") + 1])
-    soup = client(event_url)
+    event_status, start_date = client.extract(event_url, _parse_event_homepage)
+
+    # we don't actually need the start date if the event
+    # has already started to just return a dummy date
+    if start_date is None:
+        start_date = datetime.datetime.now()
+    return event_status, start_date
+
 
+@strained(EVENT_PAGE)
+def _parse_event_homepage(soup):
     try:
         event_status = (
             soup.find("span", class_="status-module__status")
@@ -224,14 +299,12 @@ def get_event_data_from_event_homepage(event):
         )
     except AttributeError:
         if soup.find("div", id="live-strip") is not None:
-            return "live", datetime.datetime.now()
+            return "live", None
         else:
             raise ValueError("Event homepage is off")
 
-    # we don't actually need the start date if the event
-    # has already started to just return a dummy date
     if event_status == "live":
-        return event_status, datetime.datetime.now()
+        return event_status, None
 
     month, start_day, year = soup.find(
         "span", class_="event-information__meta-item--date-range"
@@ -247,13 +320,21 @@ def get_event_data_from_event_homepage(event):
 #                       Round Page parsers
 # =============================================================================
 def get_round_url(round_):
-    url = get_event_results_url(round_.event)
-    return url + f"&roundId={round_.id}"
+    return get_round_urls(round_.event, [round_.id])[0]
+
+
+def get_round_urls(event, round_ids):
+    url = get_event_results_url(event)
+    return [url + f"&roundId={id}" for id in round_ids]
 
 
 def get_round_ids(event):
     event_url = get_event_results_url(event)
-    soup = client(event_url)
+    return list(client.extract(event_url, _parse_round_ids))
+
+
+@strained(EVENT_PAGE)
+def _parse_round_ids(soup):
     round_link_divs = soup.find_all(
         "div", class_="post-event-watch-round-nav__item"
     )
@@ -288,20 +369,14 @@ def get_round_ids(event):
     return sorted(list(set(round_ids)))
 
 
-def find_heat_divs(round_url, heat_id=None):
+def find_heat_divs(soup, round_url, heat_id=None):
     attrs = {"data-heat-id": heat_id} if heat_id is not None else None
-
-    heat_types = ["heat", "wave-pool-hybrid"]
-    bracket_types = ["grid", "bracket-stage"]
-    it = product(heat_types, bracket_types)
-    classes = [f"post-event-watch-{i}-{j}__heat" for i, j in it]
-
-    divs = client(round_url).find_all("div", class_=classes, attrs=attrs)
+    divs = soup.find_all("div", class_=_HEAT_DIV_CLASSES, attrs=attrs)
     if not divs:
         raise ParserError(
             round_url,
             "No heat divs of classes {} with attribute 'data-heat-id'".format(
-                ", ".join([f"'{i}'" for i in classes])
+                ", ".join([f"'{i}'" for i in _HEAT_DIV_CLASSES])
             ),
         )
 
@@ -310,24 +385,35 @@ def find_heat_divs(round_url, heat_id=None):
     return divs[0]
 
 
-def get_heat_ids(round_url):
-    heat_divs = find_heat_divs(round_url)
-    heat_ids = []
-    for div in heat_divs:
+def parse_round(round_url):
+    """
+    Parse every heat on a round page in a single pass, returning
+    a dict mapping each heat's ID to its `(status, scores)`, in
+    the order the heats appear on the page
+    """
+    return client.extract(round_url, _parse_round, round_url)
+
+
+@strained(ROUND_PAGE)
+def _parse_round(soup, round_url):
+    heats = {}
+    for div in find_heat_divs(soup, round_url):
         try:
             heat_id = div.attrs["data-heat-id"]
         except KeyError:
-            print(div)
-            continue
-            raise ParserError(
-                round_url,
-                "Heat div missing attr 'data-heat-id'. "
+            app.logger.warning(
+                "Skipping heat div missing attr 'data-heat-id' on {}. "
                 "Available attrs are {}".format(
-                    json.dumps(div.attrs, indent=4)
-                ),
+                    round_url, json.dumps(div.attrs)
+                )
             )
-        heat_ids.append(int(heat_id))
-    return heat_ids
+            continue
+        heats.setdefault(int(heat_id), _parse_heat_div(div))
+    return heats
+
+
+def get_heat_ids(round_url):
+    return list(parse_round(round_url))
 
 
 def get_heat_status(heat_div):
@@ -348,7 +434,13 @@ def get_heat_status(heat_div):
 
 
 def get_heat_data(round_url, heat_id):
-    heat_div = find_heat_divs(round_url, heat_id)
+    try:
+        return parse_round(round_url)[int(heat_id)]
+    except KeyError:
+        raise ParserError(round_url, f"No heat div with ID {heat_id}")
+
+
+def _parse_heat_div(heat_div):
     status = get_heat_status(heat_div)
 
     # next get athlete names and scores
@@ -384,8 +476,15 @@ def parse_bracket(round_url):
 
     base_round_id = int(_re.search(r"roundId=(\d+)", round_url).group(1))
 
-    soup = client(round_url)
-    rounds = defaultdict(dict)
+    # copy so that callers can index missing rounds without
+    # adding them to the cached data
+    rounds = client.extract(round_url, _parse_bracket, base_round_id)
+    return defaultdict(dict, rounds)
+
+
+@strained(ROUND_PAGE)
+def _parse_bracket(soup, base_round_id):
+    rounds = {}
     columns = soup.find_all("div", class_="bracket-stage-round")
 
     # data-pickem-gtm is no longer populated; use data-heat-id
@@ -423,6 +522,6 @@ def parse_bracket(round_url):
             except ValueError:
                 score = None if not status else 0
             results.append((name.text, score))
-        rounds[round_id][heat_id] = (status, results)
+        rounds.setdefault(round_id, {})[heat_id] = (status, results)
 
     return rounds
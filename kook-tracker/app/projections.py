@@ -0,0 +1,324 @@
+"""
+Projects how an event's team standings are likely to finish by
+playing out the rest of its bracket many thousands of times at once.
+Where `scoring.compute_points_possible` gives the most each roster
+could end up with, this gives the points each can expect, along
+with its odds of taking gold or silver.
+
+The bracket's current state comes from the event's rounds, heats
+and results, pulled in a single query. Completed heats keep their
+results, and each heat still to be decided is won by either athlete
+with equal probability or, when weighting by scores, with
+probability proportional to the average heat score each has put up
+in the event so far. Athletes still to make it into the bracket
+out of the earlier rounds fill its open slots at random.
+"""
+
+import typing
+from collections import defaultdict
+from dataclasses import dataclass
+
+import numpy as np
+from sqlalchemy import select
+
+from app import Config, app, db
+from app.kooks import RosterIndex
+from app.models import wsl
+from app.scoring import EventScores
+
+# pseudo-heats of the field's average score that every athlete's
+# average gets shrunk towards, so one big heat doesn't dominate
+_PRIOR_HEATS = 1
+
+
+@dataclass
+class TeamProjection:
+    """
+    How a team is projected to finish an event: its expected points,
+    and its chances of gold and silver, with ties splitting a medal
+    """
+
+    expected: float
+    gold: float
+    silver: float
+
+
+@dataclass
+class _Heat:
+    number: int
+    completed: bool
+    # (athlete ID or `None` for a placeholder, score)
+    results: typing.List[typing.Tuple[typing.Optional[int], float]]
+
+
+class Bracket:
+    """
+    The state of an event's heats, as needed to simulate the rest
+    of it: the bracket rounds' heats in order, and the athletes
+    from the rounds before it who are still waiting on a spot
+    """
+
+    def __init__(
+        self,
+        rounds: typing.List[typing.List[_Heat]],
+        pending: typing.Dict[int, int],
+        scores: typing.Dict[int, typing.List[float]],
+    ):
+        self.rounds = rounds
+        self.pending = pending
+        self.scores = scores
+
+    @classmethod
+    def load(cls, event: wsl.Event) -> typing.Optional["Bracket"]:
+        """
+        Read the bracket of `event`, or return `None` if it
+        doesn't have one shaped like a head-to-head bracket yet
+        """
+        rows = db.session.execute(
+            select(
+                wsl.Round.number,
+                wsl.Heat.id,
+                wsl.Heat.completed,
+                wsl.HeatResult.athlete_id,
+                wsl.Athlete.name,
+                wsl.HeatResult.score,
+            )
+            .join(wsl.Heat, wsl.Heat.round_id == wsl.Round.id)
+            .outerjoin(wsl.HeatResult, wsl.HeatResult.heat_id == wsl.Heat.id)
+            .outerjoin(
+                wsl.Athlete, wsl.HeatResult.athlete_id == wsl.Athlete.id
+            )
+            .where(wsl.Round.event_id == event.id)
+            .order_by(wsl.Round.number, wsl.Heat.id, wsl.HeatResult.index)
+        )
+
+        heats, scores = {}, defaultdict(list)
+        for number, heat_id, completed, athlete_id, name, score in rows:
+            heat = heats.setdefault(
+                heat_id, _Heat(number, bool(completed), [])
+            )
+            if athlete_id is None:
+                continue
+            if wsl._is_placeholder_athlete_name(name):
+                athlete_id = None
+            elif score is not None:
+                scores[athlete_id].append(float(score))
+            heat.results.append((athlete_id, float(score or 0)))
+
+        pre_bracket = wsl._get_num_pre_bracket_rounds(event.year)
+        rounds = defaultdict(list)
+        for heat in heats.values():
+            rounds[heat.number].append(heat)
+        numbers = sorted(n for n in rounds if n >= pre_bracket)
+        bracket = [rounds[n] for n in numbers]
+
+        # every round should have half the heats of the one before,
+        # down to the final, each with no more than two athletes
+        if not bracket or len(bracket[-1]) != 1:
+            return None
+        for heats_, next_heats in zip(bracket, bracket[1:]):
+            if len(heats_) != 2 * len(next_heats):
+                return None
+        if any(len(h.results) > 2 for heats_ in bracket for h in heats_):
+            return None
+
+        # the athletes out of the earlier rounds who haven't been
+        # knocked out and don't have a spot in the bracket yet,
+        # along with the furthest round they've made it to
+        placed = {a for h in bracket[0] for a, _ in h.results}
+        furthest = {}
+        for number in sorted(n for n in rounds if n < pre_bracket):
+            for heat in rounds[number]:
+                low = min([score for _, score in heat.results], default=0)
+                for athlete_id, score in heat.results:
+                    if athlete_id is None or athlete_id in placed:
+                        continue
+                    # athletes are only out once they've come last
+                    # in a completed heat, same as in `EventScores`
+                    out = heat.completed and score == low
+                    furthest[athlete_id] = (number, out)
+        pending = {a: n for a, (n, out) in furthest.items() if not out}
+        return cls(bracket, pending, scores)
+
+    def get_strengths(self, athletes: typing.List[int]) -> np.ndarray:
+        """
+        Each athlete's average heat score in the event so far, shrunk
+        towards the field's average, for weighting who wins heats
+        """
+        totals = [sum(self.scores.get(a, [])) for a in athletes]
+        counts = [len(self.scores.get(a, [])) for a in athletes]
+        field = sum(totals) / sum(counts) if sum(counts) else 1.0
+        strengths = (np.array(totals) + _PRIOR_HEATS * field) / (
+            np.array(counts) + _PRIOR_HEATS
+        )
+        return np.maximum(strengths, 1e-3)
+
+
+def simulate(
+    bracket: Bracket,
+    scores: EventScores,
+    num_samples: int,
+    weighted: bool = True,
+    rng: typing.Optional[np.random.Generator] = None,
+) -> typing.Tuple[typing.List[int], np.ndarray]:
+    """
+    Play out the rest of `bracket` `num_samples` times, returning
+    the IDs of the athletes in it along with an array of the points
+    each finished with in each sample, shaped `(num_samples, athletes)`
+    """
+    rng = rng or np.random.default_rng()
+    athletes = sorted(
+        {
+            a
+            for heats in bracket.rounds
+            for h in heats
+            for a, _ in h.results
+            if a is not None
+        }
+        | set(bracket.pending)
+    )
+    column = {athlete_id: i for i, athlete_id in enumerate(athletes)}
+
+    # empty slots get filled by an extra athlete who loses every
+    # heat they're in, and whose points get thrown away at the end
+    empty = len(athletes)
+    if weighted:
+        strengths = bracket.get_strengths(athletes)
+    else:
+        strengths = np.ones(len(athletes))
+    strengths = np.append(strengths, 0.0)
+
+    # everyone starts out with what they've scored so far, which for
+    # anyone left in the bracket gets overwritten once they go out
+    points = np.array(
+        [scores.get(a).score for a in athletes] + [0], dtype=np.int64
+    )
+    points = np.tile(points, (num_samples, 1))
+    samples = np.arange(num_samples)[:, None]
+
+    first = []
+    for heat in bracket.rounds[0]:
+        slots = [column[a] if a is not None else -1 for a, _ in heat.results]
+        first.extend(slots + [-1] * (2 - len(slots)))
+    first = np.array(first)
+    slots = np.tile(first, (num_samples, 1))
+
+    # pick which of the athletes still waiting on a spot get one,
+    # weighted by their strength (the Gumbel-max trick, applied to
+    # all of them at once), then shuffle them into the open slots
+    pending = np.array([column[a] for a in bracket.pending], dtype=np.int64)
+    open_slots = np.flatnonzero(first == -1)
+    num_placed = min(len(pending), len(open_slots))
+    if num_placed:
+        keys = np.log(strengths[pending]) + rng.gumbel(
+            size=(num_samples, len(pending))
+        )
+        chosen = pending[np.argsort(-keys, axis=1)[:, :num_placed]]
+        order = np.argsort(rng.random((num_samples, len(open_slots))), axis=1)
+        slots[samples, open_slots[order[:, :num_placed]]] = chosen
+    slots[slots == -1] = empty
+
+    # whoever doesn't get a spot goes out where they are
+    for athlete_id, number in bracket.pending.items():
+        points[:, column[athlete_id]] = scores.tier(number)
+
+    for heats in bracket.rounds:
+        a, b = slots[:, 0::2], slots[:, 1::2]
+        strength_a, strength_b = strengths[a], strengths[b]
+        total = strength_a + strength_b
+        p = np.divide(
+            strength_a, total, out=np.full(a.shape, 0.5), where=total > 0
+        )
+        a_wins = rng.random(a.shape) < p
+        winners = np.where(a_wins, a, b)
+        losers = np.where(a_wins, b, a)
+
+        for j, heat in enumerate(heats):
+            if not heat.completed or len(heat.results) < 2:
+                continue
+            (winner, _), (loser, __) = sorted(
+                heat.results, key=lambda result: result[1], reverse=True
+            )
+            if winner is not None and loser is not None:
+                winners[:, j], losers[:, j] = column[winner], column[loser]
+
+        number = heats[0].number
+        points[samples, losers] = scores.tier(number)
+        slots = winners
+    points[samples, slots] = scores.tier(number + 1)
+    return athletes, points[:, :empty]
+
+
+def project_event(
+    event: wsl.Event,
+    scores: EventScores,
+    index: RosterIndex,
+    num_samples: typing.Optional[int] = None,
+    weighted: typing.Optional[bool] = None,
+) -> typing.Dict[str, TeamProjection]:
+    """
+    Project how every team in `event` will finish, keyed by kook
+    name, or return an empty dict if its bracket can't be simulated.
+    The samples are seeded by the event's data version, so the
+    projection only changes when the event does.
+    """
+    if num_samples is None:
+        num_samples = Config.PROJECTION_SAMPLES
+    if weighted is None:
+        weighted = Config.PROJECTION_WEIGHTING == "scores"
+
+    rosters = index.get_rosters(event.year, event.name)
+    bracket = Bracket.load(event) if rosters else None
+    if bracket is None:
+        app.logger.debug(f"Can't project event {event.year} {event.name}")
+        return {}
+
+    rng = np.random.default_rng([event.id, event.data_version])
+    athletes, points = simulate(bracket, scores, num_samples, weighted, rng)
+    column = {athlete_id: i for i, athlete_id in enumerate(athletes)}
+
+    # sum each roster's athletes' points with a single matrix product,
+    # adding on the fixed points of those who aren't in the bracket
+    ids = wsl.athlete_index.get_many(
+        [name for roster in rosters.values() for name in roster]
+    )
+    kooks = list(rosters)
+    membership = np.zeros((len(kooks), len(athletes)), dtype=np.int64)
+    fixed = np.zeros(len(kooks), dtype=np.int64)
+    for k, kook in enumerate(kooks):
+        for name in rosters[kook]:
+            athlete_id = ids.get(name)
+            if athlete_id is None:
+                continue
+            elif athlete_id in column:
+                membership[k, column[athlete_id]] += 1
+            else:
+                fixed[k] += scores.get(athlete_id).score
+    totals = points @ membership.T + fixed
+
+    # medals follow `scoring.award_medals`: nobody gets one unless
+    # somebody's scored, and a tie for first splits gold and leaves
+    # no silver
+    top = totals.max(axis=1, keepdims=True)
+    is_top = (totals == top) & (top > 0)
+    num_top = is_top.sum(axis=1, keepdims=True)
+    gold = (is_top / np.maximum(num_top, 1)).mean(axis=0)
+
+    # silver goes to whoever's next, if there's anybody left after
+    # the gold medalist
+    floor = np.iinfo(totals.dtype).min
+    rest = np.where(is_top, floor, totals)
+    is_second = (rest == rest.max(axis=1, keepdims=True)) & (rest > floor)
+    is_second &= ~is_top & (num_top == 1)
+    num_second = np.maximum(is_second.sum(axis=1, keepdims=True), 1)
+    silver = (is_second / num_second).mean(axis=0)
+
+    expected = totals.mean(axis=0)
+    return {
+        kook: TeamProjection(
+            expected=float(expected[k]),
+            gold=float(gold[k]),
+            silver=float(silver[k]),
+        )
+        for k, kook in enumerate(kooks)
+    }
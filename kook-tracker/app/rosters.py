@@ -1,6 +1,112 @@
+import datetime
+import hashlib
 import json
+import os
+import threading
 from pathlib import Path
 
+from app import app
+
 roster_dir = Path(__file__).parent / "rosters"
-rosters = json.loads((roster_dir / "teams.json").read_text())
-year_long_picks = json.loads((roster_dir / "year_longs.json").read_text())
+_FILES = ("teams.json", "year_longs.json")
+
+
+class RosterStore:
+    """
+    The team rosters and year long picks in `roster_dir`, loaded the
+    first time they're asked for rather than at import, and reloaded
+    whenever `ops/update_rosters.py` (or anything else) changes them,
+    without the app having to restart.
+
+    `build` gets passed the parsed contents of each file, a version
+    digest of them all and the last time (in UTC) any of them was
+    modified. Whatever it builds from them is kept as a
+    snapshot which is swapped out all at once, so a request that
+    grabs one sees the same rosters throughout. Checking for changes
+    only costs a `stat` of each file, and a file whose modification
+    time changed only gets parsed again if its contents did too.
+    Only one thread reloads at a time: the rest keep using the
+    snapshot they already have until it's done, so requests never
+    wait on a reload, just the very first load.
+    """
+
+    def __init__(self, build, directory=roster_dir):
+        self.build = build
+        self.paths = [Path(directory) / fname for fname in _FILES]
+
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+        # per file: the (mtime, size) it was last checked at,
+        # along with the digest and parsed contents at that time
+        self._stats = {}
+        self._digests = {}
+        self._contents = {}
+
+    def _stat(self, path):
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _changed(self):
+        try:
+            return any(self._stats.get(p) != self._stat(p) for p in self.paths)
+        except OSError:
+            # a file going missing mid-update isn't worth
+            # giving up on the rosters we already have
+            return False
+
+    def _reload(self):
+        stats, digests, contents = {}, {}, {}
+        for path in self.paths:
+            stats[path] = self._stat(path)
+            content = path.read_bytes()
+            digests[path] = hashlib.md5(content).hexdigest()
+
+            # only parse files whose contents actually changed
+            if digests[path] == self._digests.get(path):
+                contents[path] = self._contents[path]
+            else:
+                contents[path] = json.loads(content)
+
+        if digests != self._digests or self._snapshot is None:
+            version = hashlib.md5(
+                "".join(digests[p] for p in self.paths).encode()
+            ).hexdigest()
+            mtime = max(stats[p][0] for p in self.paths)
+            modified_at = datetime.datetime.fromtimestamp(
+                mtime / 1e9, datetime.timezone.utc
+            ).replace(tzinfo=None)
+            snapshot = self.build(
+                *[contents[p] for p in self.paths], version, modified_at
+            )
+            app.logger.info(f"Loaded rosters version {version}")
+            self._snapshot = snapshot
+
+        self._stats, self._digests, self._contents = stats, digests, contents
+
+    def get(self):
+        """
+        The latest snapshot of the rosters, reloading them first
+        if they've changed and nobody else is already doing it
+        """
+        snapshot = self._snapshot
+        if snapshot is not None and not self._changed():
+            return snapshot
+
+        # only wait on whoever's reloading if there's nothing to use yet
+        if not self._lock.acquire(blocking=snapshot is None):
+            return snapshot
+
+        try:
+            if self._snapshot is None or self._changed():
+                try:
+                    self._reload()
+                except (OSError, ValueError):
+                    # e.g. a file caught partway through being written:
+                    # keep serving what we had and try again next time
+                    if self._snapshot is None:
+                        raise
+                    app.logger.exception("Failed to reload rosters")
+            return self._snapshot
+        finally:
+            self._lock.release()
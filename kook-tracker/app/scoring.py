@@ -0,0 +1,542 @@
+"""
+Scores every athlete and team in an event. Rather than querying
+each rostered athlete's results one at a time and walking their
+heats and rounds through lazy relationships, `EventScores` pulls
+an event's rounds, heats and results in a single joined query
+and works out each athlete's standing from that.
+
+The standings this produces get persisted (see
+`app.models.standings`) and kept up to date incrementally: any
+transaction that writes heat results rescores just the athletes
+in those heats, and the teams with them rostered, before it
+commits. Pages read the persisted standings with
+`get_event_scores` and `get_team_standings`, which never write:
+anything missing or out of date gets scored on the fly, and
+persisted by the updater with `backfill_standings`.
+"""
+
+import hashlib
+import typing
+from collections import defaultdict
+from dataclasses import dataclass
+from itertools import groupby
+
+from sqlalchemy import delete
+from sqlalchemy import event as sa_event
+from sqlalchemy import func, insert, select
+
+from app import db
+from app.kooks import RosterIndex, get_kooks
+from app.models import standings, wsl
+
+_SCORE_BREAKDOWN = [265, 1330, 3320, 4745, 6085, 7800, 10000]
+# 2026+ format: bottom 8 seeds compete in an opening elimination round,
+# then winners advance directly into a 32-person bracket stage.
+_SCORE_BREAKDOWN_2026 = [500, 1000, 3320, 4745, 6085, 7800, 10000]
+
+
+def get_score_breakdown(year: int) -> typing.List[int]:
+    if int(year) >= 2026:
+        return _SCORE_BREAKDOWN_2026
+    return _SCORE_BREAKDOWN
+
+
+@dataclass
+class AthleteScore:
+    """
+    An athlete's standing in an event. `round_number` is the
+    number of the furthest round they've surfed in, or `None`
+    if they haven't surfed in the event at all, and `heat_index`
+    is the position of their heat in that round.
+    """
+
+    score: int
+    round_number: typing.Optional[int] = None
+    heat_index: typing.Optional[int] = None
+    heat_completed: bool = False
+    winner: bool = False
+
+
+class EventScores:
+    """
+    The scores of every athlete who's surfed in an event, keyed
+    by athlete ID, along with what's needed to score the rest
+    """
+
+    def __init__(
+        self,
+        year: int,
+        num_rounds: int,
+        athletes: typing.Dict[int, AthleteScore],
+    ):
+        self.year = int(year)
+        self.num_rounds = num_rounds
+        self.score_breakdown = get_score_breakdown(self.year)
+        self.athletes = athletes
+
+    @classmethod
+    def compute(cls, event: wsl.Event) -> "EventScores":
+        """Score every athlete in `event` from its raw results"""
+        rows = db.session.execute(
+            select(
+                wsl.Round.id,
+                wsl.Round.number,
+                wsl.Heat.id,
+                wsl.Heat.completed,
+                wsl.HeatResult.athlete_id,
+                wsl.HeatResult.score,
+            )
+            .outerjoin(wsl.Heat, wsl.Heat.round_id == wsl.Round.id)
+            .outerjoin(wsl.HeatResult, wsl.HeatResult.heat_id == wsl.Heat.id)
+            .where(wsl.Round.event_id == event.id)
+            .order_by(wsl.Round.number, wsl.Heat.id)
+        )
+
+        round_ids, heats_per_round = set(), defaultdict(int)
+        heat_indices, heat_scores, furthest = {}, defaultdict(list), {}
+        for round_id, number, heat_id, completed, athlete_id, score in rows:
+            round_ids.add(round_id)
+            if heat_id is None:
+                continue
+
+            # heats come back in ID order, so this is
+            # the heat's position in `Round.sorted_heats`
+            if heat_id not in heat_indices:
+                heat_indices[heat_id] = heats_per_round[round_id]
+                heats_per_round[round_id] += 1
+            if athlete_id is None:
+                continue
+
+            score = float(score or 0)
+            heat_scores[heat_id].append(score)
+            if athlete_id not in furthest or number > furthest[athlete_id][0]:
+                furthest[athlete_id] = (number, heat_id, completed, score)
+
+        obj = cls(event.year, len(round_ids), {})
+        for athlete_id, result in furthest.items():
+            number, heat_id, completed, score = result
+
+            # athletes "win" a completed heat
+            # as long as they didn't come last
+            winner = bool(completed) and score != min(heat_scores[heat_id])
+            obj.athletes[athlete_id] = AthleteScore(
+                score=obj.tier(number + int(winner)),
+                round_number=number,
+                heat_index=heat_indices[heat_id],
+                heat_completed=bool(completed),
+                winner=winner,
+            )
+        return obj
+
+    def tier(self, round_number: int) -> int:
+        """
+        The score for going out in round `round_number`, or for
+        winning the round before it, in this event
+        """
+        # 2026+: rounds are 0-indexed (0=Opening Round, 5=Final), so
+        # the round number (plus one for winners) maps directly into
+        # the score breakdown. Pre-2026: 6-round events are post-cut
+        # (opening elim already occurred), so offset by 1 to skip the
+        # lowest score tier, on top of a -1 adjustment.
+        if self.year >= 2026:
+            return self.score_breakdown[round_number]
+        offset = int(self.num_rounds == 6)
+        return self.score_breakdown[max(round_number - 1, 0) + offset]
+
+    def get(self, athlete_id: typing.Optional[int]) -> AthleteScore:
+        """
+        The score of the athlete with ID `athlete_id`, which for
+        athletes who haven't surfed in the event is the lowest tier
+        """
+        try:
+            return self.athletes[athlete_id]
+        except KeyError:
+            return AthleteScore(score=self.tier(0))
+
+
+def compute_points_possible(
+    heat_idx: typing.List[int],
+    leftover_positions: int,
+    score_breakdown: typing.List[int],
+) -> float:
+    """
+    Given the indices of the heats occupied by a
+    roster of athletes, as well as the number of
+    athletes on a roster who haven't been seeded
+    in an elimination heat yet, compute the highest
+    possible score achievable by such a roster according
+    to the given score breakdown.
+    """
+
+    num_rounds = len(score_breakdown) - 1
+
+    # make a list of the points that can be achieved
+    # by finishing in a given position in the Event
+    positions = []
+    for n, i in enumerate(score_breakdown):
+        exponent = max(num_rounds - n - 1, 0)
+        positions.append([i] * 2**exponent)
+
+    # simulate the Event heats for all elimination
+    # rounds to see when two rostered athletes might
+    # need to compete against one another
+    round_idx = 1
+    points_possible = 0
+    while len(heat_idx) > 1:
+        # calculate how many heats the rostered athletes
+        # will be competing in in this round
+        unique_heats = set(heat_idx)
+        for _ in range(len(heat_idx) - len(unique_heats)):
+            # if it is less than the total number of athletes,
+            # at least two of the rostered athletes are
+            # competing against one another, therfore
+            # take the corresponding score from this round
+            # for each athlete this must stop here
+            points_possible += positions[round_idx].pop(0)
+
+        # increment all the heat indices forwared to
+        # the next round by dividing them by two
+        # and then increment the round
+        heat_idx = [i // 2 for i in unique_heats]
+        round_idx += 1
+
+    if len(heat_idx) == 1:
+        # if we've gotten all the way to the end
+        # and we still have one athlete, add the
+        # winning score to the total
+        points_possible += positions[-1].pop(0)
+
+    # for those athletes which have not been seeded
+    # in an elimination round yet, take the most
+    # optimistic assumption and grant them all the
+    # highest possible remaining point totals
+    for _ in range(leftover_positions):
+        for round in positions[::-1]:
+            # iterate through the rounds backwards, starting
+            # with the most valuable
+            if round:
+                # if there are any spots left to finish in
+                # this round, add the corresponding amount
+                # of points to the running total
+                points_possible += round.pop(0)
+                break
+
+    # return the total possible number of points
+    # this roster can still score
+    return points_possible
+
+
+def score_roster(
+    athlete_ids: typing.List[int], scores: EventScores
+) -> typing.Tuple[int, int]:
+    """
+    Total up the points scored so far by a roster of the athletes
+    with IDs `athlete_ids`, along with the most it could end up with
+    """
+    # 2026+: the full breakdown applies (opening round is included in the 6).
+    # Pre-2026: 6-round events are post-cut, so slice off the lowest tier.
+    num_rounds = scores.num_rounds
+    if scores.year >= 2026:
+        breakdown_for_possible = scores.score_breakdown
+    else:
+        breakdown_for_possible = scores.score_breakdown[-num_rounds:]
+
+    total_score, possible_score, leftover_spots, heat_idx = 0, 0, 0, []
+    min_done_round = 0 if scores.year >= 2026 else 1
+    for athlete_id in athlete_ids:
+        result = scores.get(athlete_id)
+        score, last_round = result.score, result.round_number
+        total_score += score
+
+        # now do some gross logic to keep track of the points possible
+        if (
+            last_round is not None
+            and last_round >= min_done_round
+            and result.heat_completed
+            and not result.winner
+        ):
+            # this athlete is done, so add their current score
+            # to the points possible tally and be done with it
+            possible_score += score
+        elif last_round is not None and last_round >= 2:
+            # this athlete is still competing and will have been
+            # assigned a heat in the elimination phase of the
+            # tournament, so we can keep track of the indices of
+            # these heats for this kook to figure out if any of
+            # their athletes will compete before the finals
+            heat_idx.append(result.heat_index)
+        else:
+            # this athlete has not been eliminated but has not
+            # been assigned a heat in the elimination phase, so
+            # we don't know where they'll end up. For points possible
+            # then, we'll be optimistic and just assign this athlete
+            # the best possible score once all the known spots are taken
+            leftover_spots += 1
+
+    # use the collected heat indices and number of
+    # leftover spots to finish the points possible
+    # calculation for this roster
+    possible_score += compute_points_possible(
+        heat_idx, leftover_spots, breakdown_for_possible
+    )
+    return total_score, possible_score
+
+
+def award_medals(
+    team_scores: typing.List[typing.Tuple[str, int]],
+) -> typing.Dict[str, str]:
+    """
+    Rank the event-team standings and award medals: the competitor
+    whose drafted roster scored highest gets gold, second gets silver.
+
+    Ties share a place: if N competitors tie for a medal position, they
+    each get the "half" variant of that medal (e.g. two-way tie for first
+    -> two "gold-half") and the shared place(s) are consumed, so a tie
+    for first leaves no silver. Returns a dict mapping kook name to one
+    of "gold", "silver", "gold-half", "silver-half".
+    """
+    team_scores = sorted(team_scores, key=lambda kv: kv[1], reverse=True)
+
+    medal_for = {}
+    if not team_scores or team_scores[0][1] <= 0:
+        # nothing scored yet -- no medals to award
+        return medal_for
+
+    # group competitors by identical score, highest first
+    groups = [
+        [name for name, _ in members]
+        for _, members in groupby(team_scores, key=lambda kv: kv[1])
+    ]
+
+    first = groups[0]
+    if len(first) > 1:
+        # tie for first: split gold among them, no silver
+        for name in first:
+            medal_for[name] = "gold-half"
+        return medal_for
+
+    medal_for[first[0]] = "gold"
+    if len(groups) >= 2:
+        second = groups[1]
+        suffix = "-half" if len(second) > 1 else ""
+        for name in second:
+            medal_for[name] = "silver" + suffix
+    return medal_for
+
+
+def _digest(roster: typing.List[str]) -> str:
+    return hashlib.md5("\n".join(roster).encode()).hexdigest()
+
+
+def _write_athletes(
+    event: wsl.Event,
+    scores: EventScores,
+    athlete_ids: typing.Optional[typing.Set[int]] = None,
+):
+    stmt = delete(standings.AthleteStanding).where(
+        standings.AthleteStanding.event_id == event.id
+    )
+    if athlete_ids is None:
+        athlete_ids = scores.athletes
+    else:
+        stmt = stmt.where(
+            standings.AthleteStanding.athlete_id.in_(list(athlete_ids))
+        )
+    db.session.execute(stmt)
+
+    # athletes that aren't in the event anymore just get deleted
+    rows = []
+    for athlete_id in athlete_ids:
+        try:
+            result = scores.athletes[athlete_id]
+        except KeyError:
+            continue
+        rows.append(
+            {
+                "event_id": event.id,
+                "athlete_id": athlete_id,
+                "points": result.score,
+                "round_number": result.round_number,
+                "heat_index": result.heat_index,
+                "heat_completed": result.heat_completed,
+                "winner": result.winner,
+            }
+        )
+    if rows:
+        db.session.execute(insert(standings.AthleteStanding), rows)
+
+
+def _write_teams(
+    event: wsl.Event,
+    scores: EventScores,
+    index: RosterIndex,
+    athlete_ids: typing.Optional[typing.Set[int]] = None,
+):
+    """
+    Rescore the teams in `event` that have any of `athlete_ids`
+    rostered (or all of them if it's `None`), along with any whose
+    roster in `index` has changed since they were last scored,
+    then rerank the medals
+    """
+    rosters = index.get_rosters(event.year, event.name)
+    ids = wsl.athlete_index.get_many(
+        [name for roster in rosters.values() for name in roster]
+    )
+    rows = {
+        row.kook: row
+        for row in standings.TeamStanding.query.filter_by(event_id=event.id)
+    }
+
+    for name, row in list(rows.items()):
+        if name not in rosters:
+            db.session.delete(row)
+            rows.pop(name)
+
+    for name, roster in rosters.items():
+        roster_ids = [ids[athlete] for athlete in roster if athlete in ids]
+        digest = _digest(roster)
+        try:
+            row = rows[name]
+        except KeyError:
+            row = standings.TeamStanding(event_id=event.id, kook=name)
+            db.session.add(row)
+            rows[name] = row
+        else:
+            if (
+                athlete_ids is not None
+                and row.roster == digest
+                and athlete_ids.isdisjoint(roster_ids)
+            ):
+                continue
+
+        row.score, row.possible = score_roster(roster_ids, scores)
+        row.roster = digest
+
+    medal_for = award_medals([(row.kook, row.score) for row in rows.values()])
+    for name, row in rows.items():
+        row.medal = medal_for.get(name)
+
+
+def refresh_standings(
+    event: wsl.Event, athlete_ids: typing.Optional[typing.Set[int]] = None
+) -> EventScores:
+    """
+    Rescore `athlete_ids` in `event` (or every athlete if it's
+    `None`) and the teams that have them rostered, and write
+    their standings to the current transaction
+    """
+    scores = EventScores.compute(event)
+    _write_athletes(event, scores, athlete_ids)
+    _write_teams(event, scores, get_kooks().index, athlete_ids)
+    return scores
+
+
+def _refresh_stale(session):
+    for event_id, athlete_ids in standings.pop_stale(session).items():
+        refresh_standings(session.get(wsl.Event, event_id), athlete_ids)
+
+
+sa_event.listen(db.session, "before_commit", _refresh_stale)
+sa_event.listen(db.session, "after_rollback", standings.pop_stale)
+
+
+def get_event_scores(event: wsl.Event) -> EventScores:
+    """Read the standings of every athlete in `event`"""
+    rows = standings.AthleteStanding.query.filter_by(event_id=event.id).all()
+    if not rows:
+        # either the event was created before standings were
+        # kept, or it doesn't have any results to score yet
+        return EventScores.compute(event)
+
+    num_rounds = db.session.scalar(
+        select(func.count(wsl.Round.id)).where(wsl.Round.event_id == event.id)
+    )
+    athletes = {
+        row.athlete_id: AthleteScore(
+            score=row.points,
+            round_number=row.round_number,
+            heat_index=row.heat_index,
+            heat_completed=row.heat_completed,
+            winner=row.winner,
+        )
+        for row in rows
+    }
+    return EventScores(event.year, num_rounds, athletes)
+
+
+def _is_stale(rows, rosters):
+    return rows.keys() != rosters.keys() or any(
+        rows[name].roster != _digest(roster)
+        for name, roster in rosters.items()
+    )
+
+
+def _score_teams(
+    event: wsl.Event, scores: EventScores, rosters: typing.Dict
+) -> typing.Dict[str, standings.TeamStanding]:
+    """
+    Score every team in `rosters` without writing anything, as
+    standings that never get added to the session
+    """
+    ids = wsl.athlete_index.get_many(
+        [name for roster in rosters.values() for name in roster]
+    )
+    rows = {}
+    for name, roster in rosters.items():
+        roster_ids = [ids[athlete] for athlete in roster if athlete in ids]
+        score, possible = score_roster(roster_ids, scores)
+        rows[name] = standings.TeamStanding(
+            event_id=event.id,
+            kook=name,
+            score=score,
+            possible=possible,
+            roster=_digest(roster),
+        )
+
+    medal_for = award_medals([(row.kook, row.score) for row in rows.values()])
+    for name, row in rows.items():
+        row.medal = medal_for.get(name)
+    return rows
+
+
+def get_team_standings(
+    event: wsl.Event, index: RosterIndex
+) -> typing.Dict[str, standings.TeamStanding]:
+    """
+    Read the standings of every team in `event`, keyed by kook
+    name, rescoring them on the fly if any roster in `index` has
+    changed since they were last written
+    """
+    rosters = index.get_rosters(event.year, event.name)
+    rows = standings.TeamStanding.query.filter_by(event_id=event.id).all()
+    rows = {row.kook: row for row in rows}
+    if _is_stale(rows, rosters):
+        rows = _score_teams(event, get_event_scores(event), rosters)
+    return rows
+
+
+def backfill_standings(event: wsl.Event, index: RosterIndex) -> bool:
+    """
+    Write the standings of `event` to the current transaction if
+    they're missing, or if any roster in `index` has changed since
+    its team was scored. Returns whether anything needed writing.
+    """
+    has_athletes = db.session.scalar(
+        select(standings.AthleteStanding.event_id)
+        .where(standings.AthleteStanding.event_id == event.id)
+        .limit(1)
+    )
+    if has_athletes is None:
+        # events without any results have nothing to write
+        scores = EventScores.compute(event)
+        if scores.athletes:
+            _write_athletes(event, scores)
+            _write_teams(event, scores, index)
+            return True
+
+    rosters = index.get_rosters(event.year, event.name)
+    rows = standings.TeamStanding.query.filter_by(event_id=event.id)
+    if not _is_stale({row.kook: row for row in rows}, rosters):
+        return False
+    _write_teams(event, get_event_scores(event), index, set())
+    return True
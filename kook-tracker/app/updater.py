@@ -0,0 +1,321 @@
+"""
+Keeps the incomplete events in the database up to date with
+WSL, so that page views only ever have to read from the database
+and never wait on worldsurfleague.com. Run it alongside the web
+workers with
+
+    flask updater
+
+Rather than re-scraping everything on a fixed interval, each
+event gets polled on a schedule set by what's going on in it:
+often while its heats are in the water or it's between heats on a
+running day, less often once it's been called off for the day, and
+not at all before its start date or after it's over.
+
+It also runs the jobs that web workers queue up to build events
+in the background, see `app.jobs`.
+"""
+
+import datetime
+import heapq
+import itertools
+import time
+
+import click
+from sqlalchemy.exc import OperationalError
+
+from app import Config, app, client, db, jobs, parsers, scoring
+from app.kooks import get_kooks
+from app.models import wsl
+
+
+def _update_rounds(event, rounds):
+    last_round_complete, do_break = True, False
+    for round in rounds:
+        if not round.completed:
+            # this round hasn't completed and so needs updating
+            app.logger.info(
+                f"Updating round {round.id} for event {event.name}"
+            )
+            this_round_complete = round.update()
+            if do_break:
+                break
+
+            if last_round_complete and not this_round_complete:
+                # the previous round is complete but this one
+                # isn't. This means we need to do one more
+                # update on the _next_ round to fill in any
+                # athletes that have won from this round
+                # do this by setting a flag letting it
+                # know to break after the next update
+                do_break = True
+            last_round_complete = this_round_complete
+
+
+@client.plan()
+def update_event(event):
+    """Update `event` along with each of its incomplete rounds"""
+    app.logger.debug(f"Updating event {event.name} {event.year}")
+    completed = event.update()
+    app.logger.debug(f"Event update returned status completed={completed}")
+
+    rounds = event.sorted_rounds
+    with client.prefetch([r.url for r in rounds if not r.completed]):
+        _update_rounds(event, rounds)
+
+
+def update_events():
+    """
+    Update every incomplete event in the database, returning
+    the number of events updated. Failures are logged rather
+    than raised so that one broken event can't hold up the rest.
+    """
+    events = wsl.Event.query.filter_by(completed=False).all()
+    for event in events:
+        try:
+            update_event(event)
+        except Exception:
+            app.logger.exception(
+                f"Failed to update event {event.name} {event.year}"
+            )
+            db.session.rollback()
+    return len(events)
+
+
+class Scheduler:
+    """
+    Runs jobs when they come due. Each job is a function called
+    with this scheduler and its arguments, which returns the
+    number of seconds until it needs to run again, or `None` if
+    it's done for good. A job with the same function and arguments
+    as one that's already scheduled doesn't get scheduled twice.
+    """
+
+    def __init__(self):
+        self._queue = []
+        self._scheduled = set()
+        self._counter = itertools.count()
+
+    def schedule(self, delay, job, *args):
+        key = (job, args)
+        if key in self._scheduled:
+            return
+        self._scheduled.add(key)
+
+        due = time.time() + delay
+        heapq.heappush(self._queue, (due, next(self._counter), job, args))
+
+    def run_pending(self):
+        while self._queue and self._queue[0][0] <= time.time():
+            _, __, job, args = heapq.heappop(self._queue)
+            self._scheduled.remove((job, args))
+
+            try:
+                # each job is a single operation, so it only
+                # needs any page it looks at once
+                with client.plan():
+                    delay = job(self, *args)
+            except Exception:
+                app.logger.exception(f"Job {job.__name__}{args} failed")
+                db.session.rollback()
+                delay = Config.UPDATER_ACTIVE_SECONDS
+            finally:
+                # give each job a fresh session so
+                # nothing stale gets carried over
+                db.session.remove()
+
+            if delay is not None:
+                self.schedule(delay, job, *args)
+
+    def wait(self):
+        """Sleep until the next job is due"""
+        delay = Config.UPDATER_UPCOMING_SECONDS
+        if self._queue:
+            delay = min(self._queue[0][0] - time.time(), delay)
+        time.sleep(max(delay, 0))
+
+
+def _get_poll_delay(event):
+    """
+    How long to wait before polling `event` again: often while any
+    of its heats are live or it's between heats on a running day,
+    less often once it's underway but called off for the day, and
+    once it has yet to start, not until its start date. Returns
+    `None` once it's over.
+    """
+    if event.completed:
+        return None
+
+    statuses = (
+        wsl.Heat.query.join(wsl.Round)
+        .filter(wsl.Round.event_id == event.id)
+        .with_entities(wsl.Heat.status)
+        .distinct()
+    )
+    statuses = {status for (status,) in statuses}
+    if 1 in statuses:
+        return Config.UPDATER_LIVE_SECONDS
+    elif 2 in statuses:
+        # with some heats over and more to come, the next one could
+        # hit the water any minute unless WSL says the day's done
+        if 0 not in statuses:
+            return Config.UPDATER_ACTIVE_SECONDS
+        try:
+            status, _ = parsers.get_event_data_from_event_homepage(event)
+        except ValueError:
+            return Config.UPDATER_ACTIVE_SECONDS
+        if status == "live":
+            return Config.UPDATER_LIVE_SECONDS
+        return Config.UPDATER_ACTIVE_SECONDS
+
+    # no heats have started, so check back at
+    # the start date, or sooner if it's far off
+    try:
+        _, start_date = parsers.get_event_data_from_event_homepage(event)
+    except ValueError:
+        return Config.UPDATER_UPCOMING_SECONDS
+    delay = (start_date - datetime.datetime.now()).total_seconds()
+    if delay <= 0:
+        return Config.UPDATER_ACTIVE_SECONDS
+    return min(delay, Config.UPDATER_UPCOMING_SECONDS)
+
+
+def poll_event(scheduler, event_id):
+    event = db.session.get(wsl.Event, event_id)
+    if event is None or event.completed:
+        return None
+
+    update_event(event)
+    return _get_poll_delay(event)
+
+
+def create_event(scheduler, year, name, id):
+    """
+    Create the event `name` in the `year` season as soon as it's
+    close enough to its start date, then start polling it
+    """
+    event = wsl.Event.query.filter_by(name=name, year=year).first()
+    if event is None:
+        try:
+            stat_id = parsers.get_event_stat_id(id, year, name)
+        except ValueError:
+            return Config.UPDATER_UPCOMING_SECONDS
+
+        # wait until the event's far enough along for `Event.create`
+        # to accept it, checking back in case its dates change
+        event = wsl.Event(id=id, stat_id=stat_id, name=name, year=year)
+        status, start_date = parsers.get_event_data_from_event_homepage(event)
+        if status in ("canceled", "postponed"):
+            return Config.UPDATER_UPCOMING_SECONDS
+
+        lead = datetime.timedelta(days=Config.LEAD_DAYS_FOR_EVENT_CREATION)
+        delay = (start_date - lead - datetime.datetime.now()).total_seconds()
+        if delay > 0:
+            return min(delay, Config.UPDATER_UPCOMING_SECONDS)
+
+        try:
+            event = wsl.Event.create(
+                id=id, stat_id=stat_id, name=name, year=year
+            )
+        except parsers.EventNotReady as e:
+            app.logger.info(str(e))
+            return Config.UPDATER_UPCOMING_SECONDS
+
+        app.logger.info(f"Created event {name} {year}")
+        db.session.get(wsl.Season, year).events.append(event)
+        db.session.add(event)
+        db.session.commit()
+
+    scheduler.schedule(0, poll_event, event.id)
+    return None
+
+
+def scan_season(scheduler, year):
+    """Look for any new events in the `year` season"""
+    season = db.session.get(wsl.Season, year)
+    if season is None:
+        return None
+
+    existing = {event.name for event in season.events}
+    for name, id in parsers.get_event_ids(season.url).items():
+        if name not in existing and name not in wsl.WAVEPOOL_EVENTS:
+            scheduler.schedule(0, create_event, year, name, id)
+
+    # past seasons aren't going to get any new events
+    if year < datetime.datetime.now().year:
+        return None
+    return Config.UPDATER_UPCOMING_SECONDS
+
+
+def sync(scheduler):
+    """
+    Make sure every incomplete event and current season in the
+    database is scheduled, including any the web workers create
+    """
+    for event in wsl.Event.query.filter_by(completed=False):
+        scheduler.schedule(0, poll_event, event.id)
+
+    year = datetime.datetime.now().year
+    for season in wsl.Season.query.filter(wsl.Season.year >= year):
+        scheduler.schedule(0, scan_season, season.year)
+    return Config.UPDATER_ACTIVE_SECONDS
+
+
+def backfill_standings():
+    """
+    Write the standings of every event that's missing them, or whose
+    rosters have changed since they were scored, which pages would
+    otherwise have to score on the fly every time they're viewed.
+    Returns the number of events written.
+    """
+    index = get_kooks().index
+    num_events = 0
+    for event in wsl.Event.query:
+        if scoring.backfill_standings(event, index):
+            db.session.commit()
+            num_events += 1
+    return num_events
+
+
+def backfill(scheduler):
+    num_events = backfill_standings()
+    if num_events:
+        app.logger.info(f"Backfilled standings of {num_events} events")
+    return Config.UPDATER_ACTIVE_SECONDS
+
+
+def run_jobs(scheduler):
+    """Start any jobs the web workers have queued up"""
+    try:
+        jobs.run_queued()
+    except OperationalError:
+        # e.g. SQLite being busy with a running job's writes,
+        # which isn't worth waiting any longer than usual on
+        app.logger.debug("Failed to check for jobs", exc_info=True)
+        db.session.rollback()
+    return Config.JOB_POLL_SECONDS
+
+
+@app.cli.command("updater")
+@click.option(
+    "--once",
+    is_flag=True,
+    help="Update every incomplete event once then exit",
+)
+def run_updater(once):
+    """Keep the events in the database up to date with WSL"""
+    if once:
+        num_events = update_events()
+        app.logger.info(f"Updated {num_events} events")
+        num_events = backfill_standings()
+        app.logger.info(f"Backfilled standings of {num_events} events")
+        return
+
+    app.logger.info("Starting updater")
+    scheduler = Scheduler()
+    scheduler.schedule(0, sync)
+    scheduler.schedule(0, backfill)
+    scheduler.schedule(0, run_jobs)
+    while True:
+        scheduler.run_pending()
+        scheduler.wait()
@@ -0,0 +1,182 @@
+"""
+Compare the HTML parser backends in `parser_backends` on recorded
+WSL pages. From the `kook-tracker` directory, record the pages for
+a season with
+
+    python -m benchmarks.parsers record <page_dir> --year 2025
+
+then benchmark every backend on them with
+
+    python -m benchmarks.parsers run <page_dir>
+
+Each backend runs in its own process, parsing every page and
+running the parsers which read that kind of page on it, with
+each parser's strainer unless `--no-strain` is passed. Reports
+pages parsed per second and the peak memory growth from holding
+the parsed copies of every page at once, and checks that all the
+backends extract the same data.
+"""
+
+import argparse
+import multiprocessing
+import resource
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from config import Config
+from parser_backends import BACKENDS, get_backend
+
+from app import parsers
+
+# the parsers to run on each kind of recorded page, with
+# any extra arguments they need beyond the page itself
+EXTRACTORS = {
+    "season": [(parsers._parse_season_homepage, (2000,))],
+    "event": [
+        (parsers._parse_event_homepage, ()),
+        (parsers._parse_event_stat_id, ()),
+        (parsers._parse_round_ids, ()),
+    ],
+    "round": [(parsers._parse_round, ("",))],
+    "bracket": [(parsers._parse_bracket, (0,)), (parsers._parse_round, ("",))],
+}
+
+
+def _save(page_dir, kind, url):
+    from app import client
+
+    n = len(list(page_dir.glob(f"{kind}-*.html")))
+    path = page_dir / f"{kind}-{n:03d}.html"
+    path.write_bytes(client.fetch(url).body)
+    print(f"Saved {url} to {path}")
+
+
+def record(page_dir, year):
+    page_dir.mkdir(parents=True, exist_ok=True)
+
+    season_url = f"{Config.MAIN_URL}/events/{year}/mct?all=1"
+    _save(page_dir, "season", season_url)
+    for name, id in parsers.get_event_ids(season_url).items():
+        try:
+            stat_id = parsers.get_event_stat_id(id, year, name)
+        except ValueError:
+            continue
+
+        event = SimpleNamespace(id=id, name=name, year=year, stat_id=stat_id)
+        _save(page_dir, "event", parsers.get_event_results_url(event))
+        try:
+            round_ids = parsers.get_round_ids(event)
+        except (parsers.EventNotReady, ValueError):
+            continue
+
+        pre_bracket = 1 if year >= 2026 else 2
+        urls = parsers.get_round_urls(event, round_ids[: pre_bracket + 1])
+        for url in urls[:-1]:
+            _save(page_dir, "round", url)
+        _save(page_dir, "bracket", urls[-1])
+
+
+def _max_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, macOS reports bytes
+    if sys.platform == "darwin":
+        rss /= 1024
+    return rss / 1024
+
+
+def _extract(backend, body, kind, strain):
+    """
+    Parse a page and run its parsers on it the way `Client`
+    does, returning the extracted data and the parsed documents
+    """
+    docs, results = {}, []
+    for func, args in EXTRACTORS[kind]:
+        strainer = getattr(func, "strainer", None) if strain else None
+        if strainer not in docs:
+            docs[strainer] = backend.parse(body, strainer)
+
+        try:
+            results.append(func(docs[strainer], *args))
+        except Exception as e:
+            results.append(repr(e))
+    return results, docs
+
+
+def _benchmark(backend_name, pages, repeats, strain, conn):
+    backend = get_backend(backend_name)
+
+    # peak memory: hold the parsed copies of every page
+    # at once, the way a prefetched create or update does
+    rss = _max_rss_mb()
+    extracted = [_extract(backend, body, kind, strain) for kind, body in pages]
+    peak_mb = _max_rss_mb() - rss
+    results = [result for result, _ in extracted]
+    del extracted
+
+    # throughput: parse each page and run its parsers on it
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for kind, body in pages:
+            _extract(backend, body, kind, strain)
+    elapsed = time.perf_counter() - start
+
+    conn.send((len(pages) * repeats / elapsed, peak_mb, results))
+    conn.close()
+
+
+def run(page_dir, repeats, backends, strain=True):
+    pages = []
+    for path in sorted(page_dir.glob("*.html")):
+        kind = path.name.split("-")[0]
+        if kind in EXTRACTORS:
+            pages.append((kind, path.read_bytes()))
+    if not pages:
+        raise ValueError(f"No recorded pages found in {page_dir}")
+
+    num_bytes = sum([len(body) for _, body in pages])
+    print(f"Benchmarking on {len(pages)} pages ({num_bytes / 1e6:0.1f} MB)")
+
+    # fresh process for each backend so that
+    # their peak memory can't interfere
+    ctx = multiprocessing.get_context("spawn")
+    results = {}
+    print(f"{'backend':<10}{'pages/sec':>12}{'peak MB':>12}")
+    for name in backends:
+        recv, send = ctx.Pipe(duplex=False)
+        process = ctx.Process(
+            target=_benchmark, args=(name, pages, repeats, strain, send)
+        )
+        process.start()
+        pages_per_sec, peak_mb, results[name] = recv.recv()
+        process.join()
+        print(f"{name:<10}{pages_per_sec:>12.1f}{peak_mb:>12.1f}")
+
+    reference = backends[0]
+    for name in backends[1:]:
+        if results[name] != results[reference]:
+            print(f"WARNING: {name} and {reference} extracted different data")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser("record")
+    record_parser.add_argument("page_dir", type=Path)
+    record_parser.add_argument("--year", type=int, required=True)
+
+    run_parser = subparsers.add_parser("run")
+    run_parser.add_argument("page_dir", type=Path)
+    run_parser.add_argument("--repeats", type=int, default=5)
+    run_parser.add_argument(
+        "--backends", nargs="+", choices=list(BACKENDS), default=list(BACKENDS)
+    )
+    run_parser.add_argument("--no-strain", action="store_true")
+
+    args = parser.parse_args()
+    if args.command == "record":
+        record(args.page_dir, args.year)
+    else:
+        run(args.page_dir, args.repeats, args.backends, not args.no_strain)
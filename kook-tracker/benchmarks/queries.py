@@ -0,0 +1,258 @@
+"""
+Time the main queries behind the routes and the updater on
+several seasons of synthetic data, and print their query plans,
+both before and after the indexes added in migration
+`fc4c2e1f2fb2`. From the `kook-tracker` directory, run
+
+    python -m benchmarks.queries
+
+This builds a throwaway SQLite database by default. Pass an empty
+database with `--database-url` to benchmark something else, e.g.
+Postgres: the migrations get run on it from scratch.
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from types import SimpleNamespace
+
+from sqlalchemy import MetaData, func, insert, select, text
+
+BEFORE_REVISION = "9bd534a4f694"
+EVENTS_PER_SEASON = 11
+HEATS_PER_ROUND = [12, 16, 8, 4, 2, 1]
+
+
+def _reflect(db):
+    """
+    The tables as they are at `BEFORE_REVISION`, which the seeding
+    and queries stick to so that they run the same on either side of
+    the upgrade, whatever columns later migrations have added since
+    """
+    metadata = MetaData()
+    names = ["athlete", "season", "event", "round", "heat", "heat_result"]
+    metadata.reflect(db.engine, only=names)
+    return SimpleNamespace(**metadata.tables)
+
+
+def _seed(db, tables, num_seasons, num_athletes, num_duplicates):
+    """
+    Fill the database with `num_seasons` seasons of made up events,
+    including `num_duplicates` athletes whose names repeat another's
+    """
+    names = [f"A. Surfer{i}" for i in range(num_athletes)]
+    names += random.sample(names, num_duplicates)
+    athletes = [{"id": i + 1, "name": name} for i, name in enumerate(names)]
+
+    seasons, events, rounds, heats, results = [], [], [], [], []
+    for year in range(2026 - num_seasons + 1, 2027):
+        seasons.append({"year": year})
+        for e in range(EVENTS_PER_SEASON):
+            event_id = year * 100 + e
+            events.append(
+                {
+                    "id": event_id,
+                    "stat_id": event_id,
+                    "name": f"event-{e}",
+                    "year": year,
+                    "completed": True,
+                }
+            )
+            for number, num_heats in enumerate(HEATS_PER_ROUND):
+                round_id = event_id * 10 + number
+                rounds.append(
+                    {
+                        "id": round_id,
+                        "event_id": event_id,
+                        "number": number,
+                        "completed": True,
+                    }
+                )
+                for h in range(num_heats):
+                    heat_id = round_id * 100 + h
+                    heats.append(
+                        {
+                            "id": heat_id,
+                            "round_id": round_id,
+                            "status": 2,
+                            "completed": True,
+                        }
+                    )
+                    num_surfers = 3 if number == 0 else 2
+                    for index in range(num_surfers):
+                        athlete = random.choice(athletes)
+                        results.append(
+                            {
+                                "heat_id": heat_id,
+                                "index": index,
+                                "athlete_id": athlete["id"],
+                                "score": round(random.uniform(0, 20), 2),
+                            }
+                        )
+
+    for table, rows in [
+        (tables.athlete, athletes),
+        (tables.season, seasons),
+        (tables.event, events),
+        (tables.round, rounds),
+        (tables.heat, heats),
+        (tables.heat_result, results),
+    ]:
+        db.session.execute(insert(table), rows)
+    db.session.commit()
+    return len(heats), len(results)
+
+
+def _get_queries(db, tables):
+    """
+    Build the queries the routes and updater run most, with
+    parameters picked from the seeded data
+    """
+    athlete, event, round_, heat, heat_result = (
+        tables.athlete,
+        tables.event,
+        tables.round,
+        tables.heat,
+        tables.heat_result,
+    )
+    event_id, year, name = random.choice(
+        db.session.execute(
+            select(event.c.id, event.c.year, event.c.name)
+        ).all()
+    )
+    round_id = random.choice(
+        db.session.scalars(
+            select(round_.c.id).where(round_.c.event_id == event_id)
+        ).all()
+    )
+    athlete_id, athlete_name = random.choice(
+        db.session.execute(select(athlete.c.id, athlete.c.name)).all()
+    )
+
+    return {
+        "athlete by name": select(athlete).where(
+            athlete.c.name == athlete_name
+        ),
+        "event by year and name": select(event).where(
+            event.c.year == year, event.c.name == name
+        ),
+        "rounds of event": select(round_).where(round_.c.event_id == event_id),
+        "heats of round": select(heat).where(heat.c.round_id == round_id),
+        # `routes._compute_athlete_event_score`
+        "athlete event results": (
+            select(heat_result)
+            .join(heat, heat_result.c.heat_id == heat.c.id)
+            .join(round_, heat.c.round_id == round_.c.id)
+            .join(event, round_.c.event_id == event.c.id)
+            .where(
+                heat_result.c.athlete_id == athlete_id, event.c.id == event_id
+            )
+        ),
+        # `updater._get_poll_delay`
+        "event heat statuses": (
+            select(heat.c.status)
+            .join(round_, heat.c.round_id == round_.c.id)
+            .where(round_.c.event_id == event_id)
+            .distinct()
+        ),
+    }
+
+
+def _explain(db, stmt):
+    dialect = db.engine.dialect
+    sql = str(
+        stmt.compile(dialect=dialect, compile_kwargs={"literal_binds": True})
+    )
+    if dialect.name == "sqlite":
+        rows = db.session.execute(text("EXPLAIN QUERY PLAN " + sql))
+        return [row[-1] for row in rows]
+    rows = db.session.execute(text("EXPLAIN " + sql))
+    return [row[0] for row in rows]
+
+
+def _report(db, queries, repeats, verbose):
+    timings = {}
+    for name, stmt in queries.items():
+        start = time.perf_counter()
+        for _ in range(repeats):
+            db.session.execute(stmt).all()
+        timings[name] = (time.perf_counter() - start) / repeats * 1000
+
+        if verbose:
+            print(f"  {name}:")
+            for line in _explain(db, stmt):
+                print(f"    {line}")
+    return timings
+
+
+def main(database_url, num_seasons, num_athletes, repeats, verbose):
+    if database_url is None:
+        tmpdir = tempfile.mkdtemp()
+        database_url = "sqlite:///" + os.path.join(tmpdir, "benchmark.db")
+
+    # the app reads its database from the environment at import
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["PAGE_STORE_DIR"] = ""
+    from flask_migrate import upgrade
+
+    from app import app, db
+
+    random.seed(0)
+    migrations = os.path.join(os.path.dirname(__file__), "..", "migrations")
+    with app.app_context():
+        upgrade(directory=migrations, revision=BEFORE_REVISION)
+        tables = _reflect(db)
+        num_heats, num_results = _seed(
+            db, tables, num_seasons, num_athletes, num_duplicates=10
+        )
+        print(
+            "Seeded {} seasons: {} heats and {} heat results".format(
+                num_seasons, num_heats, num_results
+            )
+        )
+
+        queries = _get_queries(db, tables)
+        print("Before indexes")
+        before = _report(db, queries, repeats, verbose)
+        db.session.remove()
+
+        count = select(func.count()).select_from(tables.athlete)
+        num_athletes = db.session.scalar(count)
+        upgrade(directory=migrations)
+        merged = num_athletes - db.session.scalar(count)
+        print(f"After indexes ({merged} duplicate athletes merged)")
+
+        # start over with new connections, since the sqlite driver
+        # caches statements, EXPLAINs included, per connection
+        db.session.remove()
+        db.engine.dispose()
+        after = _report(db, queries, repeats, verbose)
+
+    print(f"\n{'query':<26}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+    for name in queries:
+        print(
+            "{:<26}{:>12.3f}{:>12.3f}{:>9.1f}x".format(
+                name, before[name], after[name], before[name] / after[name]
+            )
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--seasons", type=int, default=10)
+    parser.add_argument("--athletes", type=int, default=300)
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument(
+        "--quiet", action="store_true", help="Don't print query plans"
+    )
+    args = parser.parse_args()
+    main(
+        args.database_url,
+        args.seasons,
+        args.athletes,
+        args.repeats,
+        not args.quiet,
+    )
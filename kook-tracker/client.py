@@ -1,29 +1,422 @@
+import hashlib
+import threading
 import time
-import urllib.request
-from functools import lru_cache
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
-from bs4 import BeautifulSoup as bs
+import requests
 from config import Config
+from page_store import PageStore
+from parser_backends import get_backend
+from requests.adapters import HTTPAdapter
+from requests.utils import DEFAULT_ACCEPT_ENCODING
+
+Page = namedtuple("Page", ["body", "digest", "etag", "last_modified"])
+
+
+class PageCache:
+    """
+    Thread-safe LRU cache whose entries expire `ttl` seconds
+    after they're added. Least recently used entries get
+    evicted once the cache holds more than `max_entries`
+    entries or more than `max_bytes` total bytes, where the
+    size of each entry is specified when it's added.
+    """
+
+    def __init__(self, ttl=None, max_entries=None, max_bytes=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.num_bytes = 0
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _pop(self, key):
+        _, size, __ = self._entries.pop(key)
+        self.num_bytes -= size
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                expires, _, value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+
+            if expires is not None and expires < time.time():
+                self._pop(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, size=0):
+        expires = None if self.ttl is None else time.time() + self.ttl
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = (expires, size, value)
+            self.num_bytes += size
+
+            while self._entries and (
+                (self.max_entries and len(self) > self.max_entries)
+                or (self.max_bytes and self.num_bytes > self.max_bytes)
+            ):
+                self._pop(next(iter(self._entries)))
+                self.evictions += 1
+
+    @property
+    def stats(self):
+        return {
+            "entries": len(self),
+            "bytes": self.num_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class _PinnedPage:
+    def __init__(self, page):
+        self.page = page
+
+        # parsed documents, keyed by the strainer they were parsed with
+        self.soups = {}
+
+
+_MISSING = object()
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def canonicalize_url(url):
+    """
+    Spell `url` the same way as every other url for the same page,
+    so that they all share one copy of it: with a lowercase scheme
+    and host, no default port or fragment, and sorted query params
+    """
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    netloc = (parts.hostname or "").lower()
+    if parts.port is not None and parts.port != _DEFAULT_PORTS.get(scheme):
+        netloc += f":{parts.port}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, parts.path or "/", query, ""))
+
+
+def _page_from_record(record):
+    return Page(
+        record["body"],
+        record["digest"],
+        record["etag"],
+        record["last_modified"],
+    )
 
 
 class Client:
-    def __init__(self, app=None):
+    def __init__(self, app=None, max_workers=None):
         self.app = app
+        self.max_workers = max_workers or Config.CLIENT_MAX_WORKERS
+        self.timeout = (
+            Config.CLIENT_CONNECT_TIMEOUT,
+            Config.CLIENT_READ_TIMEOUT,
+        )
+
+        # one long-lived session so that connections to WSL get kept
+        # alive and reused between requests rather than paying for a
+        # new TCP + TLS handshake on every page. `pool_block` caps the
+        # number of simultaneous connections to any one host at
+        # `CLIENT_MAX_CONNECTIONS_PER_HOST`, with extra requests waiting
+        # for a connection to free up
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_maxsize=Config.CLIENT_MAX_CONNECTIONS_PER_HOST,
+            pool_block=True,
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
 
-    def get_ttl_hash(self):
-        """Return the same value withing `seconds` time period"""
-        return round(time.time() / Config.CLIENT_WAIT_SECONDS)
+        # ask for compressed pages: includes brotli whenever
+        # it's installed, otherwise just gzip and deflate
+        self.session.headers["Accept-Encoding"] = DEFAULT_ACCEPT_ENCODING
 
-    @lru_cache
-    def make_request(self, url, ttl_hash=None):
+        # what we use to turn pages into documents for the parsers
+        self.backend = get_backend(Config.PARSER_BACKEND)
+
+        # raw page bodies, keyed by url and refreshed every
+        # `CLIENT_WAIT_SECONDS`. Parsed soups are much too heavy
+        # to hold on to, so the only things we keep around past
+        # a single operation are these bytes and the (much smaller)
+        # data that the parsers extract from them
+        self.pages = PageCache(
+            ttl=Config.CLIENT_WAIT_SECONDS,
+            max_entries=Config.CLIENT_CACHE_MAX_ENTRIES,
+            max_bytes=Config.CLIENT_CACHE_MAX_BYTES,
+        )
+
+        # values returned by `extract`, keyed by the digest of the
+        # page they were extracted from. These never go stale (a page
+        # with new content has a new digest), so they only get evicted
+        self.extracts = PageCache(
+            max_entries=Config.CLIENT_EXTRACT_CACHE_MAX_ENTRIES
+        )
+
+        # pages on disk shared with every other worker, so that
+        # between all of them WSL only gets hit once per url
+        # per `CLIENT_WAIT_SECONDS`
+        if Config.PAGE_STORE_DIR:
+            self.store = PageStore(
+                Config.PAGE_STORE_DIR, ttl=Config.CLIENT_WAIT_SECONDS
+            )
+        else:
+            self.store = None
+
+        # stack of {canonical url: pinned page} dicts pinned by
+        # `prefetch` and `plan`. Kept per-thread so that concurrent
+        # requests don't see (or release) each other's pages
+        self._local = threading.local()
+
+    @property
+    def _pinned(self):
         try:
-            with urllib.request.urlopen(url) as html:
-                if self.app is not None:
-                    self.app.logger.info(f"Request to {url} successful")
-                return bs(html, "lxml")
+            return self._local.pinned
+        except AttributeError:
+            self._local.pinned = []
+            return self._local.pinned
+
+    @property
+    def _plan(self):
+        return getattr(self._local, "plan", None)
+
+    def _get_pinned(self, url):
+        url = canonicalize_url(url)
+        for pages in reversed(self._pinned):
+            try:
+                return pages[url]
+            except KeyError:
+                continue
+        raise KeyError(url)
 
-        except urllib.request.HTTPError as e:
+    @property
+    def stats(self):
+        return {"pages": self.pages.stats, "extracts": self.extracts.stats}
+
+    def make_request(self, url, validators=None):
+        """
+        Request the page at `url`. If `validators` from a previously
+        fetched copy of the page are passed and WSL reports that the
+        page hasn't changed since then, returns `None`.
+        """
+        headers = {}
+        if validators is not None:
+            etag, last_modified = validators
+            if etag is not None:
+                headers["If-None-Match"] = etag
+            if last_modified is not None:
+                headers["If-Modified-Since"] = last_modified
+
+        try:
+            response = self.session.get(
+                url, headers=headers, timeout=self.timeout
+            )
+            response.raise_for_status()
+        except requests.HTTPError as e:
             raise Exception("Unrecognized url {}".format(url)) from e
 
-    def __call__(self, url):
-        return self.make_request(url, ttl_hash=self.get_ttl_hash())
+        if response.status_code == 304:
+            if self.app is not None:
+                self.app.logger.info(f"Page at {url} unchanged")
+            return None
+
+        if self.app is not None:
+            self.app.logger.info(f"Request to {url} successful")
+
+        body = response.content
+        return Page(
+            body,
+            hashlib.blake2b(body, digest_size=16).hexdigest(),
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+        )
+
+    def _fetch_from_store(self, url):
+        record = self.store.get(url)
+        if record is not None and self.store.is_fresh(record):
+            return _page_from_record(record)
+
+        # only let one worker go out to WSL at a time, and
+        # check if someone else already has while we waited
+        with self.store.lock(url):
+            record = self.store.get(url)
+            if record is None:
+                validators = None
+            elif self.store.is_fresh(record):
+                return _page_from_record(record)
+            else:
+                validators = (record["etag"], record["last_modified"])
+
+            page = self.make_request(url, validators)
+            if page is None:
+                # the page hasn't changed, so hang on to the stored
+                # copy. Its digest is the same too, so nothing will
+                # need to get re-parsed
+                self.store.touch(url, record)
+                return _page_from_record(record)
+
+            self.store.put(url, *page)
+            return page
+
+    def fetch(self, url):
+        """Return the raw `Page` at `url`, from the cache if possible"""
+        try:
+            return self._get_pinned(url).page
+        except KeyError:
+            pass
+
+        key = canonicalize_url(url)
+        page = self.pages.get(key)
+        if page is None:
+            if self.store is not None:
+                page = self._fetch_from_store(key)
+            else:
+                page = self.make_request(key)
+            self.pages.put(key, page, size=len(page.body))
+
+        plan = self._plan
+        if plan is not None:
+            plan[key] = _PinnedPage(page)
+        return page
+
+    def fetch_many(self, urls):
+        """
+        Fetch all of `urls` concurrently using at most `max_workers`
+        threads, returning a dict mapping each url to its pinned page.
+        Urls which fail to load are logged and left out, so that the
+        parser which needs them can raise the usual error when it
+        requests them itself.
+        """
+        pages = {}
+        for url in dict.fromkeys(map(canonicalize_url, urls)):
+            try:
+                pages[url] = self._get_pinned(url)
+            except KeyError:
+                pages[url] = None
+        urls = [url for url, page in pages.items() if page is None]
+
+        def fetch(url):
+            try:
+                return _PinnedPage(self.fetch(url))
+            except Exception as e:
+                if self.app is not None:
+                    self.app.logger.warning(f"Prefetch of {url} failed: {e}")
+                return None
+
+        if len(urls) < 2:
+            fetched = map(fetch, urls)
+        else:
+            num_workers = min(self.max_workers, len(urls))
+            with ThreadPoolExecutor(num_workers) as executor:
+                fetched = list(executor.map(fetch, urls))
+
+        pages.update(zip(urls, fetched))
+        return {url: page for url, page in pages.items() if page is not None}
+
+    @contextmanager
+    def prefetch(self, urls):
+        """
+        Fetch `urls` concurrently and pin them for the duration of
+        the context, so that any parser which requests one of them
+        gets the prefetched copy rather than going back out to the
+        network. Each pinned page is parsed at most once.
+        """
+        pages = self.fetch_many(urls)
+        plan = self._plan
+        if plan is not None:
+            # pages fetched as part of a plan stay pinned until it's over
+            plan.update(pages)
+            yield pages
+            return
+
+        self._pinned.append(pages)
+        try:
+            yield pages
+        finally:
+            self._pinned.remove(pages)
+
+    @contextmanager
+    def plan(self):
+        """
+        Pin every page fetched for the duration of the context, so that
+        an operation which goes back to the same page more than once
+        (like creating or updating an event) downloads and parses each
+        distinct page only once, however long the operation takes.
+        Plans nested inside of another just join the outer one, and
+        like `prefetch` they only apply to the thread that made them.
+        """
+        if self._plan is not None:
+            yield
+            return
+
+        plan = self._local.plan = {}
+        self._pinned.append(plan)
+        try:
+            yield
+        finally:
+            self._pinned.remove(plan)
+            self._local.plan = None
+
+    def alias(self, url, target):
+        """
+        For the rest of the current plan, serve requests for `url` with
+        the page already fetched from `target`, for when a parser can
+        tell that both urls lead to the same page. Does nothing outside
+        of a plan, or if `target` hasn't been fetched as part of it.
+        """
+        plan = self._plan
+        if plan is None:
+            return
+        try:
+            plan[canonicalize_url(url)] = plan[canonicalize_url(target)]
+        except KeyError:
+            pass
+
+    def extract(self, url, func, *args):
+        """
+        Return `func(soup, *args)` for the parsed page at `url`,
+        reusing the result from the last time it was computed if
+        the page content hasn't changed since then. If `func` has
+        been marked with a `parser_backends.Strainer`, only the
+        regions of the page it reads get parsed.
+        """
+        page = self.fetch(url)
+        key = (page.digest, func.__module__, func.__qualname__, args)
+        value = self.extracts.get(key, _MISSING)
+        if value is _MISSING:
+            strainer = getattr(func, "strainer", None)
+            value = func(self(url, strainer), *args)
+            self.extracts.put(key, value)
+        return value
+
+    def __call__(self, url, strainer=None):
+        try:
+            pinned = self._get_pinned(url)
+        except KeyError:
+            return self.backend.parse(self.fetch(url).body, strainer)
+
+        try:
+            return pinned.soups[strainer]
+        except KeyError:
+            soup = self.backend.parse(pinned.page.body, strainer)
+            pinned.soups[strainer] = soup
+            return soup
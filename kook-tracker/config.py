@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 
 def get_database_url():
@@ -17,7 +18,59 @@ class Config:
 
     LOG_DIR = os.environ.get("LOG_DIR", ".")
     CLIENT_WAIT_SECONDS = 1
+    # max number of WSL pages to fetch at once
+    CLIENT_MAX_WORKERS = int(os.environ.get("CLIENT_MAX_WORKERS", 8))
+    CLIENT_MAX_CONNECTIONS_PER_HOST = int(
+        os.environ.get("CLIENT_MAX_CONNECTIONS_PER_HOST", 8)
+    )
+    CLIENT_CONNECT_TIMEOUT = 5
+    CLIENT_READ_TIMEOUT = 30
+    # budgets for the in-memory caches of raw WSL pages
+    # and of the data the parsers extract from them
+    CLIENT_CACHE_MAX_ENTRIES = 256
+    CLIENT_CACHE_MAX_BYTES = int(
+        os.environ.get("CLIENT_CACHE_MAX_BYTES", 32 * 1024 * 1024)
+    )
+    CLIENT_EXTRACT_CACHE_MAX_ENTRIES = 4096
+    # directory for the page store shared between workers. Set
+    # to an empty string to have each worker fetch on its own
+    PAGE_STORE_DIR = os.environ.get(
+        "PAGE_STORE_DIR",
+        os.path.join(tempfile.gettempdir(), "kook-tracker-pages"),
+    )
+    # budgets for the in-memory cache of rendered season
+    # and event pages, see `response_cache.ResponseCache`
+    RESPONSE_CACHE_MAX_ENTRIES = 512
+    RESPONSE_CACHE_MAX_BYTES = int(
+        os.environ.get("RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+    )
+    # whether to report on the caches at /cache-stats, which is
+    # otherwise only served when the app's running in debug mode
+    CACHE_STATS_ENABLED = os.environ.get("CACHE_STATS_ENABLED", "0") == "1"
+    # number of times the rest of a live event gets played out to
+    # project its team standings, and whether heats get decided by
+    # the athletes' scores so far ("scores") or a coin flip
+    # ("uniform"), see `app.projections`
+    PROJECTION_SAMPLES = int(os.environ.get("PROJECTION_SAMPLES", 10000))
+    PROJECTION_WEIGHTING = os.environ.get("PROJECTION_WEIGHTING", "scores")
+    # number of threads the updater runs event-building jobs on, how
+    # often it checks for new ones (and checks in on the ones it's
+    # running), and how long a running job can go without checking in
+    # before it's taken to have been abandoned, see `app.jobs`
+    JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 1))
+    JOB_POLL_SECONDS = int(os.environ.get("JOB_POLL_SECONDS", 5))
+    JOB_TIMEOUT_SECONDS = int(os.environ.get("JOB_TIMEOUT_SECONDS", 300))
+    # how WSL pages get parsed, see `parser_backends.BACKENDS`
+    PARSER_BACKEND = os.environ.get("PARSER_BACKEND", "lxml")
     MAIN_URL = "https://www.worldsurfleague.com"
+    # seconds the updater waits between polls of an event while it has
+    # heats in the water, while it's underway with none in the water,
+    # and at most while it's waiting on an event to start
+    UPDATER_LIVE_SECONDS = int(os.environ.get("UPDATER_LIVE_SECONDS", 30))
+    UPDATER_ACTIVE_SECONDS = int(os.environ.get("UPDATER_ACTIVE_SECONDS", 300))
+    UPDATER_UPCOMING_SECONDS = int(
+        os.environ.get("UPDATER_UPCOMING_SECONDS", 3600)
+    )
 
     # don't allow an event to be created unless we're less than this many
     # days before start date (assuming it hasn't been cancelled or postponed)
@@ -0,0 +1,130 @@
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+# number of lock files that urls get spread across, so that the
+# lock directory stays the same size however many urls pass through
+_NUM_LOCK_STRIPES = 256
+
+
+class PageStore:
+    """
+    Store of raw WSL pages on local disk, shared by every
+    worker process pointed at the same `root` directory.
+    Page bodies are content-addressed by their digest under
+    `root/blobs`, and each url gets a small record under
+    `root/urls` pointing at its current body along with the
+    validators (`ETag` and `Last-Modified`) WSL sent with it,
+    so that stale pages can be revalidated with a conditional
+    GET rather than downloaded again.
+    """
+
+    def __init__(self, root, ttl, max_age=24 * 60 * 60):
+        self.ttl = ttl
+        self.max_age = max_age
+        self._num_writes = 0
+
+        self.blob_dir = os.path.join(root, "blobs")
+        self.url_dir = os.path.join(root, "urls")
+        self.lock_dir = os.path.join(root, "locks")
+        for d in [self.blob_dir, self.url_dir, self.lock_dir]:
+            os.makedirs(d, exist_ok=True)
+
+    def _key(self, url):
+        return hashlib.sha256(url.encode()).hexdigest()
+
+    def _write(self, path, content):
+        # write to a temporary file then move it into place so
+        # that other workers never read a partially written file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp, path)
+
+    @contextmanager
+    def lock(self, url):
+        """
+        Hold an exclusive lock on `url` across all processes
+        (and threads) using this store, so that only one of
+        them goes out to WSL for it at a time. Urls share a fixed
+        set of lock files rather than getting one each, since
+        those can't be safely deleted while anyone might want them
+        """
+        stripe = int(self._key(url), 16) % _NUM_LOCK_STRIPES
+        path = os.path.join(self.lock_dir, f"{stripe:02x}")
+        with open(path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def get(self, url):
+        """
+        Return the stored record for `url`, including its `body`,
+        or `None` if it hasn't been stored. Stale records are still
+        returned so that their validators can be used: check them
+        with `is_fresh`.
+        """
+        path = os.path.join(self.url_dir, self._key(url))
+        try:
+            with open(path) as f:
+                record = json.load(f)
+            with open(
+                os.path.join(self.blob_dir, record["digest"]), "rb"
+            ) as f:
+                record["body"] = f.read()
+        except (OSError, ValueError, KeyError):
+            return None
+        return record
+
+    def is_fresh(self, record):
+        return (time.time() - record["fetched"]) < self.ttl
+
+    def put(self, url, body, digest, etag=None, last_modified=None):
+        blob = os.path.join(self.blob_dir, digest)
+        if os.path.exists(blob):
+            # mark the blob as recently used so that it doesn't get pruned
+            os.utime(blob)
+        else:
+            self._write(blob, body)
+
+        record = {
+            "url": url,
+            "digest": digest,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched": time.time(),
+        }
+        path = os.path.join(self.url_dir, self._key(url))
+        self._write(path, json.dumps(record).encode())
+
+        self._num_writes += 1
+        if self._num_writes % 100 == 0:
+            self.prune()
+
+    def touch(self, url, record):
+        """Mark a stored page as freshly revalidated"""
+        self.put(
+            url,
+            record["body"],
+            record["digest"],
+            record["etag"],
+            record["last_modified"],
+        )
+
+    def prune(self):
+        """Delete any page bodies that haven't been used in `max_age`"""
+        cutoff = time.time() - self.max_age
+        for d in [self.blob_dir, self.url_dir]:
+            for entry in os.scandir(d):
+                try:
+                    if entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    # another worker beat us to it
+                    continue
@@ -0,0 +1,264 @@
+"""
+Backends for turning raw WSL page bodies into documents the
+functions in `app.parsers` can query. Every backend returns
+nodes exposing the same small subset of the BeautifulSoup
+API that the parsers use (`find`, `find_all`,
+`find_next_sibling`, `attrs`, `get`, `text`), so that the
+parsers don't need to know which one they're running on.
+
+Parsers can also declare the regions of a page they read with a
+`Strainer`, in which case backends only build those parts of it.
+"""
+
+import re
+from functools import lru_cache
+
+from bs4 import BeautifulSoup, SoupStrainer
+from lxml import etree, html
+
+# page content that no parser ever reads, dropped from the
+# raw body before parsing it with a strainer. Matches lazily
+# up to the first closing tag the same way HTML parsers do
+_UNREAD = re.compile(
+    rb"<(script|style)\b[^>]*>.*?</\1\s*>|<!--.*?-->", re.S | re.I
+)
+
+
+class Strainer:
+    """
+    The regions of a page that a parser reads, each specified
+    as a tag name and a dict of attribute values that the tag
+    needs to have. `class` values can be a list of classes, any
+    one of which can match. Backends parsing with a strainer only
+    build the outermost tags matching one of these regions (along
+    with everything inside them), so that the rest of the page
+    (scripts, navigation, footers, etc.) never gets materialized.
+    """
+
+    def __init__(self, *regions):
+        self.regions = []
+        for name, attrs in regions:
+            attrs = {
+                attr: [value] if isinstance(value, str) else list(value)
+                for attr, value in attrs.items()
+            }
+            self.regions.append((name, attrs))
+
+        conditions = []
+        for name, attrs in self.regions:
+            condition = [f"self::{name}"]
+            for attr, values in attrs.items():
+                if attr == "class":
+                    condition.append(" or ".join(map(_has_class, values)))
+                else:
+                    condition.append(
+                        " or ".join(
+                            [f"@{attr}={_xpath_literal(v)}" for v in values]
+                        )
+                    )
+            conditions.append(" and ".join([f"({c})" for c in condition]))
+        match = " or ".join([f"({c})" for c in conditions])
+        self.xpath = etree.XPath(f"//*[{match}][not(ancestor::*[{match}])]")
+
+    def matches(self, name, attrs):
+        for region_name, region_attrs in self.regions:
+            if name != region_name:
+                continue
+
+            for attr, values in region_attrs.items():
+                value = attrs.get(attr)
+                if value is None:
+                    break
+                elif attr == "class":
+                    if isinstance(value, str):
+                        value = value.split()
+                    if not any([v in value for v in values]):
+                        break
+                elif value not in values:
+                    break
+            else:
+                return True
+        return False
+
+
+def strained(strainer):
+    """Mark the regions of a page that the decorated parser reads"""
+
+    def decorator(func):
+        func.strainer = strainer
+        return func
+
+    return decorator
+
+
+class _SoupStrainer(SoupStrainer):
+    def __init__(self, strainer):
+        super().__init__()
+        self.strainer = strainer
+
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        return self.strainer.matches(name, attrs or {})
+
+    def allow_string_creation(self, string):
+        # only called for text outside of any matching region
+        return False
+
+
+class Bs4Backend:
+    """Parse pages with BeautifulSoup on top of the lxml tree builder"""
+
+    name = "bs4"
+
+    def parse(self, body, strainer=None):
+        if strainer is None:
+            return BeautifulSoup(body, "lxml")
+        return BeautifulSoup(
+            _UNREAD.sub(b"", body), "lxml", parse_only=_SoupStrainer(strainer)
+        )
+
+
+class LxmlBackend:
+    """
+    Parse pages directly with `lxml.html` and query them with
+    compiled XPath expressions, skipping the overhead of building
+    (and holding on to) a BeautifulSoup tree on top of lxml's
+    """
+
+    name = "lxml"
+
+    def parse(self, body, strainer=None):
+        # WSL pages are utf-8, but fall back to letting
+        # lxml sniff the encoding in case one isn't
+        try:
+            body.decode("utf-8")
+        except UnicodeDecodeError:
+            parser = html.HTMLParser()
+        else:
+            parser = html.HTMLParser(encoding="utf-8")
+
+        if strainer is None:
+            return LxmlNode(html.document_fromstring(body, parser=parser))
+
+        # move the regions we want out into a document of their own,
+        # so that the rest of the page gets freed as soon as we return
+        doc = html.document_fromstring(_UNREAD.sub(b"", body), parser=parser)
+        root = html.Element("html")
+        root.extend(strainer.xpath(doc))
+        return LxmlNode(root)
+
+
+def _xpath_literal(value):
+    # XPath 1.0 strings can't escape quotes, so values with
+    # both kinds get stitched together from pieces with concat
+    value = str(value)
+    if "'" not in value:
+        return f"'{value}'"
+    elif '"' not in value:
+        return f'"{value}"'
+    pieces = [f"'{piece}'" for piece in value.split("'")]
+    separator = ', "\'", '
+    return "concat({})".format(separator.join(pieces))
+
+
+def _has_class(cls):
+    return "contains(concat(' ', normalize-space(@class), ' '), {})".format(
+        _xpath_literal(f" {cls} ")
+    )
+
+
+@lru_cache(maxsize=None)
+def _compile(axis, name, classes, attrs, first):
+    conditions = []
+    if classes:
+        conditions.append(" or ".join(map(_has_class, classes)))
+    for attr, value in attrs:
+        conditions.append(f"@{attr}={_xpath_literal(value)}")
+
+    expression = axis + (name or "*")
+    for condition in conditions:
+        expression += f"[{condition}]"
+    if first:
+        expression += "[1]"
+    return etree.XPath(expression)
+
+
+def _make_query(axis, name, class_, attrs, id, first=False, **kwargs):
+    if isinstance(class_, str):
+        class_ = [class_]
+    attrs = dict(attrs or {}, **kwargs)
+    if id is not None:
+        attrs["id"] = id
+    return _compile(
+        axis, name, tuple(class_ or ()), tuple(sorted(attrs.items())), first
+    )
+
+
+class LxmlNode:
+    """
+    Wraps an `lxml.html` element with the parts of the
+    BeautifulSoup `Tag` interface used by `app.parsers`
+    """
+
+    __slots__ = ["element"]
+
+    def __init__(self, element):
+        self.element = element
+
+    def find_all(self, name=None, class_=None, attrs=None, id=None, **kwargs):
+        query = _make_query(".//", name, class_, attrs, id, **kwargs)
+        return [LxmlNode(el) for el in query(self.element)]
+
+    def find(self, name=None, class_=None, attrs=None, id=None, **kwargs):
+        query = _make_query(".//", name, class_, attrs, id, **kwargs)
+        for element in query(self.element):
+            return LxmlNode(element)
+        return None
+
+    def find_next_sibling(
+        self, name=None, class_=None, attrs=None, id=None, **kwargs
+    ):
+        query = _make_query(
+            "following-sibling::", name, class_, attrs, id, True, **kwargs
+        )
+        for element in query(self.element):
+            return LxmlNode(element)
+        return None
+
+    @property
+    def attrs(self):
+        attrs = dict(self.element.attrib)
+        if "class" in attrs:
+            attrs["class"] = attrs["class"].split()
+        return attrs
+
+    def get(self, key, default=None):
+        if key == "class":
+            return self.attrs.get(key, default)
+        return self.element.get(key, default)
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    @property
+    def text(self):
+        return self.element.text_content()
+
+    def __str__(self):
+        return html.tostring(self.element, encoding="unicode")
+
+
+BACKENDS = {backend.name: backend for backend in [Bs4Backend, LxmlBackend]}
+
+
+def get_backend(name):
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ValueError(
+            "Unknown parser backend '{}', must be one of {}".format(
+                name, ", ".join(BACKENDS)
+            )
+        )
@@ -0,0 +1,52 @@
+import threading
+import time
+
+from client import PageCache
+
+
+class ResponseCache:
+    """
+    Rendered pages, keyed by whatever identifies the page (its
+    route arguments) along with the versions of the data it was
+    rendered from. Pages never need to be invalidated: once their
+    data changes they just get looked up under a new key, and
+    whatever's left under the old one ages out of the LRU. Keeps
+    track of how long rendering has taken on misses and roughly
+    how much of that hits have saved.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        self.pages = PageCache(max_entries=max_entries, max_bytes=max_bytes)
+        self._lock = threading.Lock()
+        self.render_seconds = self.saved_seconds = 0.0
+
+    def get(self, key, render, size=len):
+        """
+        Return the page cached under `key`, or if there isn't
+        one, call `render` to make it and cache what it returns,
+        counting `size` of it against the cache's budget
+        """
+        entry = self.pages.get(key)
+        if entry is not None:
+            body, seconds = entry
+            with self._lock:
+                self.saved_seconds += seconds
+            return body
+
+        start = time.perf_counter()
+        body = render()
+        seconds = time.perf_counter() - start
+        with self._lock:
+            self.render_seconds += seconds
+
+        self.pages.put(key, (body, seconds), size=size(body))
+        return body
+
+    @property
+    def stats(self):
+        stats = self.pages.stats
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else None
+        stats["render_seconds"] = round(self.render_seconds, 3)
+        stats["saved_seconds"] = round(self.saved_seconds, 3)
+        return stats
@@ -96,8 +96,12 @@ def update_context(json_file: str):
         content = json.load(f)
     yield content
 
-    with open(json_file, "w") as f:
+    # write to a temporary file then move it into place, since
+    # the running app reloads the file as soon as it changes
+    tmp = json_file + ".tmp"
+    with open(tmp, "w") as f:
         json.dump(content, f, indent=4)
+    os.replace(tmp, json_file)
 
 
 def update_json(filename: str, event_name: str, year: int, update: dict):